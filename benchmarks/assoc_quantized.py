@@ -0,0 +1,71 @@
+"""
+Compare similarity search over the 8-bit quantized assoc matrix with search
+over the original floating-point matrix.
+
+This reports the memory each matrix takes, the average time to score every
+term against a query, and how well the rankings agree: the fraction of the
+top `limit` terms that both find, and how often they agree on the top term.
+
+Run it with:
+
+    python -m benchmarks.assoc_quantized assoc/assoc-space-5.2 [number of queries]
+
+The space must already have a quantized matrix, from
+conceptnet5.builders.assoc_quantize.
+"""
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import QuantizedMatrix, top_n
+import numpy as np
+import sys
+import time
+
+LIMIT = 20
+
+
+def sample_vectors(space, n, seed=0):
+    rng = np.random.RandomState(seed)
+    return [space.vector_from_terms([(space.labels[row], 1.0)])
+            for row in rng.randint(0, len(space.labels), n)]
+
+
+def search(matrix, vecs):
+    start_time = time.time()
+    results = [top_n(matrix.dot(vec), LIMIT) for vec in vecs]
+    return results, time.time() - start_time
+
+
+def run(dirname, n):
+    space = AssocSpace.load_dir(dirname)
+    quantized = QuantizedMatrix.load(dirname)
+    if quantized is None:
+        print >> sys.stderr, 'No quantized matrix in %s' % dirname
+        sys.exit(1)
+    vecs = sample_vectors(space, n)
+
+    exact, exact_time = search(space.assoc, vecs)
+    approx, approx_time = search(quantized, vecs)
+    overlap = np.mean([
+        len(set(expected) & set(found)) / float(LIMIT)
+        for expected, found in zip(exact, approx)
+    ])
+    top_agreement = np.mean([
+        expected[0] == found[0] for expected, found in zip(exact, approx)
+    ])
+
+    print '%-10s %10.1f MB %8.2f ms/query' % (
+        'float', space.assoc.nbytes / 1e6, exact_time * 1000 / n
+    )
+    print '%-10s %10.1f MB %8.2f ms/query' % (
+        'int8', quantized.nbytes / 1e6, approx_time * 1000 / n
+    )
+    print 'overlap@%d: %.3f, same top term: %.3f' % (
+        LIMIT, overlap, top_agreement
+    )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        n = int(sys.argv[2])
+    else:
+        n = 200
+    run(sys.argv[1], n)
@@ -0,0 +1,82 @@
+"""
+Compare approximate similarity search with the cluster index against exact
+search over the whole AssocSpace, the way /assoc/list does it.
+
+For each number of clusters to probe, this reports the average time per
+query and recall@limit: the fraction of the exact top `limit` terms that the
+approximate search also found. Queries that the clusters can't answer count
+as finding nothing, although the API would fall back on exact search for
+them.
+
+Run it with:
+
+    python -m benchmarks.assoc_search assoc/assoc-space-5.2 [number of queries]
+
+The space must already have clusters, from conceptnet5.builders.assoc_clusters.
+"""
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import ClusterIndex
+import numpy as np
+import sys
+import time
+
+LIMIT = 20
+PROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def sample_queries(space, n, terms_per_query=3, seed=0):
+    rng = np.random.RandomState(seed)
+    nterms = len(space.labels)
+    return [
+        [(space.labels[row], 1.0)
+         for row in rng.randint(0, nterms, terms_per_query)]
+        for i in xrange(n)
+    ]
+
+
+def exact_search(space, vec, limit):
+    sims = space.assoc.dot(vec)
+    top = np.argsort(-sims)[:limit]
+    return [space.labels[row] for row in top if sims[row] > 0]
+
+
+def run(dirname, n):
+    space = AssocSpace.load_dir(dirname)
+    index = ClusterIndex.load(dirname, space)
+    if index is None:
+        print >> sys.stderr, 'No cluster index in %s' % dirname
+        sys.exit(1)
+    vecs = [space.vector_from_terms(terms)
+            for terms in sample_queries(space, n)]
+
+    start_time = time.time()
+    exact = [set(exact_search(space, vec, LIMIT)) for vec in vecs]
+    elapsed = time.time() - start_time
+    print '%-18s %8.2f ms/query  recall@%d %.3f' % (
+        'exact', elapsed * 1000 / n, LIMIT, 1.
+    )
+
+    for nprobe in PROBES:
+        if nprobe > index.nclusters:
+            break
+        found = 0
+        total = 0
+        start_time = time.time()
+        results = [index.similar_to_vector(vec, LIMIT, nprobe=nprobe) or []
+                   for vec in vecs]
+        elapsed = time.time() - start_time
+        for expected, result in zip(exact, results):
+            found += len(expected & set(label for label, score in result))
+            total += len(expected)
+        print '%-18s %8.2f ms/query  recall@%d %.3f' % (
+            'probe %d/%d' % (nprobe, index.nclusters),
+            elapsed * 1000 / n, LIMIT, float(found) / max(total, 1)
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        n = int(sys.argv[2])
+    else:
+        n = 1000
+    run(sys.argv[1], n)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Compare the speed of writing edges with json.dumps, the way FlatEdgeWriter
+used to, against the specialized encoder in conceptnet5.edges.
+
+Run it with:
+
+    python -m benchmarks.edge_encoding [number of edges]
+"""
+from conceptnet5.edges import make_edge, encode_edge, FlatEdgeWriter
+from StringIO import StringIO
+import json
+import sys
+import time
+
+
+def sample_edges(n):
+    edges = []
+    for i in xrange(n):
+        # Most edges are entirely in ASCII, but some aren't.
+        start = u'/c/en/example_%d' % (i % 5000)
+        if i % 3 == 0:
+            end = u'/c/ja/例_%d' % (i % 3000)
+        else:
+            end = u'/c/en/sample_%d' % (i % 3000)
+        edges.append(make_edge(
+            u'/r/RelatedTo', start, end,
+            dataset=u'/d/conceptnet/4/en', license=u'/l/CC/By',
+            sources=[u'/s/contributor/omcs/someone', u'/s/activity/omcs/vote'],
+            surfaceText=u'[[example]] is related to [[%s]]' % end,
+            weight=1.0 + i % 3
+        ))
+    return edges
+
+
+def write_with_json_dumps(edges, out):
+    for edge in edges:
+        print >> out, json.dumps(edge)
+
+
+def write_with_flat_writer(edges, out):
+    writer = FlatEdgeWriter(out)
+    for edge in edges:
+        writer.write(edge)
+    writer.close()
+
+
+def write_with_encode_edge(edges, out):
+    for edge in edges:
+        print >> out, encode_edge(edge, ensure_ascii=False)
+
+
+def write_with_json_dumps_unicode(edges, out):
+    for edge in edges:
+        print >> out, json.dumps(edge, ensure_ascii=False)
+
+
+def run(n):
+    edges = sample_edges(n)
+    for edge in edges[:100]:
+        assert json.loads(encode_edge(edge)) == json.loads(json.dumps(edge))
+    trials = [
+        ('json.dumps + print', write_with_json_dumps),
+        ('FlatEdgeWriter', write_with_flat_writer),
+        ('json.dumps(ensure_ascii=False)', write_with_json_dumps_unicode),
+        ('encode_edge(ensure_ascii=False)', write_with_encode_edge),
+    ]
+    for name, func in trials:
+        out = StringIO()
+        start_time = time.time()
+        func(edges, out)
+        elapsed = time.time() - start_time
+        print '%-34s %10.0f edges/second' % (name, n / elapsed)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    else:
+        n = 200000
+    run(n)
@@ -0,0 +1,70 @@
+"""
+Compare the size of API responses, and the time it takes to serialize them,
+when they contain every field of each edge and when they only contain the
+fields that a client asked for with 'fields=start,rel,end,weight'.
+
+Full responses are indented, the way flask.jsonify writes them. Responses
+with only some fields are written without whitespace, the way the API now
+writes them.
+
+Run it with:
+
+    python -m benchmarks.response_size [number of responses]
+"""
+from benchmarks.edge_encoding import sample_edges
+from conceptnet5.edges import project_edge
+import json
+import sys
+import time
+
+EDGES_PER_RESPONSE = 50
+FIELDS = ['start', 'rel', 'end', 'weight']
+
+
+def sample_responses(n):
+    edges = sample_edges(n * EDGES_PER_RESPONSE)
+    for i, edge in enumerate(edges):
+        # Solr also returns the text fields it indexes, and the score.
+        edge['startLemmas'] = edge['start'].split('/')[3]
+        edge['endLemmas'] = edge['end'].split('/')[3]
+        edge['relLemmas'] = u''
+        edge['text'] = [edge['startLemmas'], edge['endLemmas']]
+        edge['score'] = 10.0 / (1 + i % EDGES_PER_RESPONSE)
+    return [
+        {'numFound': len(edges), 'maxScore': 10.0,
+         'edges': edges[i:i + EDGES_PER_RESPONSE]}
+        for i in xrange(0, len(edges), EDGES_PER_RESPONSE)
+    ]
+
+
+def full_response(result):
+    return json.dumps(result, indent=2)
+
+
+def projected_response(result):
+    result = dict(result)
+    result['edges'] = [project_edge(edge, FIELDS) for edge in result['edges']]
+    return json.dumps(result, separators=(',', ':'))
+
+
+def run(n):
+    responses = sample_responses(n)
+    trials = [
+        ('all fields, indented', full_response),
+        ('fields=%s' % ','.join(FIELDS), projected_response),
+    ]
+    for name, func in trials:
+        start_time = time.time()
+        size = sum(len(func(result)) for result in responses)
+        elapsed = time.time() - start_time
+        print '%-32s %10.0f bytes/response %8.3f ms/response' % (
+            name, float(size) / n, elapsed * 1000 / n
+        )
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        n = int(sys.argv[1])
+    else:
+        n = 2000
+    run(n)
@@ -9,35 +9,85 @@ Fall 2011
 """
 
 import flask
-import urllib, urllib2
+from werkzeug.contrib.fixers import ProxyFix
+import base64
+import functools
+import hmac
+import urllib
 import re
 import sys
 import json
+import math
 import os
 import numpy as np
 from assoc_space import AssocSpace
-from werkzeug.contrib.cache import SimpleCache
+from conceptnet5.assoc_index import (NeighborIndex, ClusterIndex, PrefixIndex,
+    load_shared_assoc, load_quantized_assoc, similar_to_vectors)
+from conceptnet5.solr import SolrClient, ShardedSolrClient, SolrError
+from conceptnet5.cache import TTLCache, MemcacheCache
+from conceptnet5.ratelimit import TokenBucketLimiter, SharedTokenBucketLimiter
+from conceptnet5.edge_store import EdgeStore
+from conceptnet5.edges import EDGE_KEYS, project_edge
+from conceptnet5.path_index import PathIndex
 app = flask.Flask(__name__)
 
+# Behind a reverse proxy, every request comes from the proxy's address. With
+# CONCEPTNET_BEHIND_PROXY set, the client's address is taken from the last hop
+# of X-Forwarded-For, which the proxy adds, so that each client gets its own
+# rate limit. Don't set it without a proxy, or clients could choose their own
+# addresses.
+if os.environ.get('CONCEPTNET_BEHIND_PROXY'):
+    app.wsgi_app = ProxyFix(app.wsgi_app, num_proxies=1)
+
+LOG_FILE = (os.environ.get('CONCEPTNET_LOG_FILE') or
+            '/srv/conceptnet5/logs/flask_errors.log')
 if not app.debug:
     import logging
-    file_handler = logging.FileHandler('/srv/conceptnet5/logs/flask_errors.log')
+    file_handler = logging.FileHandler(LOG_FILE)
     file_handler.setLevel(logging.INFO)
     app.logger.addHandler(file_handler)
 
 ASSOC_DIR = os.environ.get('CONCEPTNET_ASSOC_DATA') or '../data/assoc/space'
+# How many clusters of terms to search for approximate matches to a term list.
+# More clusters find more of the best matches, but take longer.
+ASSOC_PROBES = int(os.environ.get('CONCEPTNET_ASSOC_PROBES', 8))
 commonsense_assoc = None
+assoc_neighbors = None
+assoc_clusters = None
+assoc_prefixes = None
 def load_assoc():
     """
     Load the association matrix. Requires the open source Python package
     'assoc_space'.
+
+    If the neighbors of each term have been precomputed with
+    conceptnet5.builders.assoc_neighbors, or the terms have been clustered
+    with conceptnet5.builders.assoc_clusters, load those indexes too. If the
+    assoc matrix was saved by conceptnet5.builders.assoc_matrix, it's
+    memory-mapped, so that every process serving the API shares it. With
+    CONCEPTNET_ASSOC_QUANTIZED set, the 8-bit matrix saved by
+    conceptnet5.builders.assoc_quantize is used instead.
     """
-    global commonsense_assoc
+    global commonsense_assoc, assoc_neighbors, assoc_clusters, assoc_prefixes
     if commonsense_assoc: return commonsense_assoc
     dirname = ASSOC_DIR
     commonsense_assoc = AssocSpace.load_dir(ASSOC_DIR)
+    if not (os.environ.get('CONCEPTNET_ASSOC_QUANTIZED') and
+            load_quantized_assoc(commonsense_assoc, ASSOC_DIR)):
+        load_shared_assoc(commonsense_assoc, ASSOC_DIR)
+    assoc_prefixes = PrefixIndex(commonsense_assoc.labels)
+    assoc_neighbors = NeighborIndex.load(ASSOC_DIR, commonsense_assoc.labels)
+    assoc_clusters = ClusterIndex.load(ASSOC_DIR, commonsense_assoc,
+                                       nprobe=ASSOC_PROBES)
     return commonsense_assoc
 
+# With CONCEPTNET_PRELOAD_ASSOC set, the assoc data is loaded when this module
+# is imported. Run gunicorn with --preload to import it once, before forking
+# the workers, so that they share the loaded data instead of each loading it
+# on their first assoc request.
+if os.environ.get('CONCEPTNET_PRELOAD_ASSOC'):
+    load_assoc()
+
 if len(sys.argv) == 1:
     root_url = 'http://conceptnet5.media.mit.edu/data/5.2'
 else:
@@ -48,7 +98,18 @@ cache_dict = {
     'limit_amount': 10000
 }
 
-request_cache = SimpleCache(default_timeout = cache_dict['limit_timeout'])
+# Each client IP address can make bursts of up to 'limit_amount' requests, and
+# gets 'limit_amount' more every 'limit_timeout' seconds. Set
+# CONCEPTNET_SHARED_RATE_LIMIT to enforce one limit across all the workers
+# that gunicorn forks, when it's run with --preload.
+if os.environ.get('CONCEPTNET_SHARED_RATE_LIMIT'):
+    limiter_class = SharedTokenBucketLimiter
+else:
+    limiter_class = TokenBucketLimiter
+rate_limiter = limiter_class(
+    float(cache_dict['limit_amount']) / cache_dict['limit_timeout'],
+    cache_dict['limit_amount']
+)
 
 def add_slash(uri):
     """
@@ -65,29 +126,52 @@ def request_limit(ip_address, amount=1):
     This function checks the query ip address and ensures that the requests
     from that address have not passed the query limit.
     """
-    if request_cache.get(ip_address) > cache_dict['limit_amount']:
-        return True, flask.Response(
+    if not rate_limiter.allow(ip_address, amount):
+        response = flask.Response(
           response=flask.json.dumps({'error': 'rate limit exceeded'}),
-          status=429, mimetype='json')
+          status=429, mimetype='application/json')
+        response.headers['Retry-After'] = str(
+            max(1, int(math.ceil(rate_limiter.retry_after(ip_address, amount))))
+        )
+        return True, response
     else:
-        request_cache.inc(ip_address, amount)
         return False, None
 
+@app.before_request
+def check_request_limit():
+    limited, response = request_limit(flask.request.remote_addr or '')
+    if limited:
+        return response
+
+# The endpoints that show the server's internal state are only served to
+# requests whose X-Admin-Key header matches CONCEPTNET_ADMIN_KEY. Without
+# CONCEPTNET_ADMIN_KEY, they're turned off.
+ADMIN_KEY = os.environ.get('CONCEPTNET_ADMIN_KEY')
+
+def admin_only(func):
+    @functools.wraps(func)
+    def check_admin_key(*args, **kwargs):
+        key = flask.request.headers.get('X-Admin-Key', '')
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        if not ADMIN_KEY or not hmac.compare_digest(key, ADMIN_KEY):
+            flask.abort(404)
+        return func(*args, **kwargs)
+    return check_admin_key
+
+@app.route('/ratelimit/info')
+@admin_only
+def rate_limit_info():
+    """
+    Show how many requests have been allowed and rejected.
+    """
+    return flask.jsonify(rate_limiter.info())
+
 @app.route('/<path:query>')
 def query_node(query):
     req_args = flask.request.args
     path = '/'+query.strip('/')
-    key = None
-    if path.startswith('/c/') or path.startswith('/r/'):
-        key = 'nodes'
-    elif path.startswith('/a/'):
-        key = 'uri'
-    elif path.startswith('/d/'):
-        key = 'dataset'
-    elif path.startswith('/l/'):
-        key = 'license'
-    elif path.startswith('/s/'):
-        key = 'sources'
+    key = node_query_key(path)
     if key is None:
         flask.abort(404)
     query_args = {key: path}
@@ -96,8 +180,29 @@ def query_node(query):
     query_args['offset'] = req_args.get('offset', '0')
     query_args['limit'] = req_args.get('limit', '50')
     query_args['filter'] = req_args.get('filter', '')
+    if 'cursor' in req_args:
+        query_args['cursor'] = req_args.get('cursor')
+    if 'fields' in req_args:
+        query_args['fields'] = req_args.get('fields')
     return search(query_args)
 
+def node_query_key(path):
+    """
+    Get the field to search for edges involving a URI, depending on what kind
+    of URI it is.
+    """
+    if path.startswith('/c/') or path.startswith('/r/'):
+        return 'nodes'
+    elif path.startswith('/a/'):
+        return 'uri'
+    elif path.startswith('/d/'):
+        return 'dataset'
+    elif path.startswith('/l/'):
+        return 'license'
+    elif path.startswith('/s/'):
+        return 'sources'
+    return None
+
 LUCENE_SPECIAL_RE = re.compile(r'([-+!(){}\[\]^"~*?:\\])')
 
 def lucene_escape(text):
@@ -110,11 +215,72 @@ def lucene_escape(text):
 PATH_FIELDS = ['id', 'uri', 'rel', 'start', 'end', 'dataset', 'license', 'nodes', 'context', 'sources']
 TEXT_FIELDS = ['surfaceText', 'text', 'startLemmas', 'endLemmas', 'relLemmas']
 STRING_FIELDS = ['features']
+# The fields of an edge that a response can be limited to.
+RESPONSE_FIELDS = EDGE_KEYS + TEXT_FIELDS + ['score']
+
+def parse_fields(query_args):
+    """
+    Get the list of fields that the client asked to get on each edge, with a
+    parameter such as 'fields=start,rel,end,weight', or None to get them all.
+    """
+    value = query_args.get('fields')
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    for field in fields:
+        if field not in RESPONSE_FIELDS:
+            flask.abort(400)
+    return fields
+
+def edges_response(result, fields):
+    """
+    Make the JSON response for a result containing edges. If the client
+    asked for only some fields, it gets only those, without the whitespace
+    that indents the full response.
+    """
+    if fields is None:
+        return flask.jsonify(result)
+    result = dict(result)
+    result['edges'] = [project_edge(edge, fields) for edge in result['edges']]
+    return flask.Response(json.dumps(result, separators=(',', ':')),
+                          mimetype='application/json')
+
+# Set CONCEPTNET_EDGE_STORE to serve edges from local files instead of Solr.
+# It can be the filename of a SQLite store built by
+# conceptnet5.builders.json_to_sqlite, or the directory of a path index built
+# by conceptnet5.builders.json_to_path_index. A SQLite store ranks edges by
+# weight. A path index doesn't rank them: it returns them in the order of the
+# paths they were found by, which is what makes its pages fast.
+EDGE_STORE_FILE = os.environ.get('CONCEPTNET_EDGE_STORE')
+edge_store = None
+def get_edge_store():
+    """
+    Open the edge store. Each process opens its own connection to it, on its
+    first request.
+    """
+    global edge_store
+    if edge_store is None:
+        if os.path.isdir(EDGE_STORE_FILE):
+            edge_store = PathIndex(EDGE_STORE_FILE)
+        else:
+            edge_store = EdgeStore(EDGE_STORE_FILE)
+    return edge_store
 
 @app.route('/search')
 def search(query_args=None):
     if query_args is None:
         query_args = flask.request.args
+    if EDGE_STORE_FILE:
+        return search_edge_store(query_args)
+    params = solr_params(query_args)
+    if params['q'] == '':
+        return see_documentation()
+    return get_query_result(params, parse_fields(query_args))
+
+def solr_params(query_args):
+    """
+    Get the parameters of the Solr query for a search.
+    """
     query_params = []
     filter_params = []
     sharded = True
@@ -144,30 +310,295 @@ def search(query_args=None):
     params['fq'] = u' AND '.join(filter_params).encode('utf-8')
     params['start'] = query_args.get('offset', '0')
     params['rows'] = query_args.get('limit', '50')
-    params['fl'] = '*,score'
+    fields = parse_fields(query_args)
+    if fields is None:
+        params['fl'] = '*,score'
+    else:
+        # The id and score are always needed to merge results from shards.
+        params['fl'] = ','.join(sorted(set(fields) | set(['id', 'score'])))
     params['wt'] = 'json'
-    params['indent'] = 'on'
+    if query_args.get('cursor') is not None:
+        # Page through the results with a cursor instead of an offset. Solr's
+        # cursors need a sort order that ends with the unique key.
+        params['cursorMark'] = query_args.get('cursor') or '*'
+        params['sort'] = 'score desc,id asc'
+        del params['start']
     if sharded:
-        params['shards'] = 'burgundy.media.mit.edu:8983/solr,claret.media.mit.edu:8983/solr'
-    if params['q'] == '':
+        params['shards'] = ','.join(SOLR_SHARDS)
+    return params
+
+def edge_store_query(query_args):
+    """
+    Get the (field, prefix) pairs and minimum weight to look up in the local
+    edge store for a search. It can search by path fields and weight, but
+    full-text searches need Solr.
+    """
+    for key in TEXT_FIELDS + STRING_FIELDS:
+        if key in query_args:
+            flask.abort(400)
+    prefixes = []
+    for key in PATH_FIELDS:
+        if key in query_args:
+            prefixes.append((key, query_args.get(key).rstrip('/')))
+    if prefixes and query_args.get('filter') == 'core-assertions':
+        prefixes.append(('dataset', '/d/conceptnet/5/combined-core'))
+    min_weight = None
+    if 'minWeight' in query_args:
+        try:
+            min_weight = float(query_args.get('minWeight'))
+        except ValueError:
+            flask.abort(400)
+    return prefixes, min_weight
+
+def search_edge_store(query_args):
+    """
+    Answer a search from the local edge store.
+    """
+    prefixes, min_weight = edge_store_query(query_args)
+    if not prefixes:
         return see_documentation()
-    return get_query_result(params)
+    try:
+        offset = int(query_args.get('offset', '0'))
+        limit = int(query_args.get('limit', '50'))
+    except ValueError:
+        flask.abort(400)
+    if query_args.get('cursor') is not None:
+        cursor = decode_cursor(query_args.get('cursor'))
+        count, edges, next_cursor = get_edge_store().query_page(
+            prefixes, min_weight, cursor, limit
+        )
+        if next_cursor is not None:
+            next_cursor = encode_cursor(next_cursor)
+        return edges_response({'numFound': count, 'edges': edges,
+                               'nextCursor': next_cursor},
+                              parse_fields(query_args))
+    count, edges = get_edge_store().query(prefixes, min_weight, offset, limit)
+    return edges_response({'numFound': count, 'edges': edges},
+                          parse_fields(query_args))
+
+def encode_cursor(value):
+    """
+    Turn the position of a page in the edge store into an opaque token that
+    a client can send back as the 'cursor' parameter.
+    """
+    return base64.urlsafe_b64encode(json.dumps(value))
+
+def decode_cursor(token):
+    """
+    Get the position that a cursor token refers to, or None for '*' or '',
+    which ask for the first page.
+    """
+    if token in ('', '*'):
+        return None
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (TypeError, ValueError, UnicodeError):
+        flask.abort(400)
 
 SOLR_BASE = 'http://salmon.media.mit.edu:8983/solr/select?'
+SOLR_SHARDS = ['burgundy.media.mit.edu:8983/solr', 'claret.media.mit.edu:8983/solr']
+
+# Each gunicorn worker gets its own pool of connections to Solr.
+solr = SolrClient(
+    SOLR_BASE,
+    pool_size=int(os.environ.get('CONCEPTNET_SOLR_POOL_SIZE', 4)),
+    timeout=float(os.environ.get('CONCEPTNET_SOLR_TIMEOUT', 10)),
+    retries=int(os.environ.get('CONCEPTNET_SOLR_RETRIES', 2))
+)
+
+# Set CONCEPTNET_SOLR_FANOUT to query the shards directly and merge their
+# results here, instead of having Solr coordinate them. Then a shard that
+# doesn't respond within CONCEPTNET_SOLR_SHARD_TIMEOUT seconds is left out,
+# and the response is marked as partial.
+if os.environ.get('CONCEPTNET_SOLR_FANOUT'):
+    sharded_solr = ShardedSolrClient(
+        ['http://%s/select' % shard for shard in SOLR_SHARDS],
+        timeout=float(os.environ.get('CONCEPTNET_SOLR_SHARD_TIMEOUT', 2)),
+        pool_size=int(os.environ.get('CONCEPTNET_SOLR_POOL_SIZE', 4))
+    )
+else:
+    sharded_solr = None
+
+# Responses from Solr are cached for a few minutes. Set
+# CONCEPTNET_MEMCACHED to 'host:port' to share the cache between workers in a
+# memcached server, instead of keeping a separate cache in each worker.
+#
+# A response can hold anywhere from no edges to a thousand, so each worker's
+# own cache is limited by the size of the responses' JSON, to
+# CONCEPTNET_RESPONSE_CACHE_MB megabytes, as well as by their number.
+RESPONSE_CACHE_TTL = int(os.environ.get('CONCEPTNET_RESPONSE_CACHE_TTL', 300))
+
+def response_size(result):
+    return len(json.dumps(result))
+
+if os.environ.get('CONCEPTNET_MEMCACHED'):
+    response_cache = MemcacheCache(
+        os.environ['CONCEPTNET_MEMCACHED'], namespace='solr:',
+        ttl=RESPONSE_CACHE_TTL
+    )
+else:
+    response_cache = TTLCache(
+        int(os.environ.get('CONCEPTNET_RESPONSE_CACHE_SIZE', 10000)),
+        ttl=RESPONSE_CACHE_TTL,
+        maxbytes=int(os.environ.get('CONCEPTNET_RESPONSE_CACHE_MB', 64)) << 20,
+        sizeof=response_size
+    )
 
 def get_link(params):
     return SOLR_BASE + urllib.urlencode(params)
 
-def get_query_result(params):
-    link = get_link(params)
-    print "Loading %s" % link
-    fp = urllib2.urlopen(link)
-    obj = json.load(fp)
-    #obj['response']['params'] = params
-    obj['response']['edges'] = obj['response']['docs']
-    del obj['response']['docs']
-    del obj['response']['start']
-    return flask.jsonify(obj['response'])
+def response_cache_key(params):
+    """
+    Get a key for a set of Solr parameters that doesn't depend on the order
+    they were given in.
+    """
+    return urllib.urlencode(sorted(params.items()))
+
+def get_query_result(params, fields=None):
+    """
+    Get the results of a Solr query as a JSON response, from the response
+    cache if possible. A request with 'Cache-Control: no-cache' skips the
+    cache and goes to Solr, updating the cache with what it gets.
+
+    If `fields` is a list of field names, the edges in the response only
+    have those fields.
+    """
+    key = response_cache_key(params)
+    bypass = 'no-cache' in flask.request.headers.get('Cache-Control', '')
+    result = None
+    if not bypass:
+        result = response_cache.get(key)
+    if result is None:
+        cache_status = bypass and 'BYPASS' or 'MISS'
+        app.logger.debug("Loading %s", get_link(params))
+        try:
+            # Cursors only work when one Solr server coordinates the shards.
+            if (sharded_solr is not None and 'shards' in params and
+                    'cursorMark' not in params):
+                obj = sharded_solr.query(params)
+            else:
+                obj = solr.query(params)
+        except SolrError, error:
+            app.logger.error("Solr query failed: %s", error)
+            if error.status == 400:
+                flask.abort(400)
+            flask.abort(503)
+        #obj['response']['params'] = params
+        result = obj['response']
+        result['edges'] = result['docs']
+        del result['docs']
+        del result['start']
+        if 'nextCursorMark' in obj:
+            # Solr gives back the same cursor after the last page.
+            if obj['nextCursorMark'] == params['cursorMark']:
+                result['nextCursor'] = None
+            else:
+                result['nextCursor'] = obj['nextCursorMark']
+        if obj.get('partial'):
+            # Some shards are missing, so don't keep this response around.
+            result['partial'] = True
+        else:
+            response_cache.set(key, result)
+    else:
+        cache_status = 'HIT'
+    response = edges_response(result, fields)
+    response.headers['X-Cache'] = cache_status
+    return response
+
+@app.route('/cache/info')
+@admin_only
+def cache_info():
+    """
+    Show how often responses are served from the cache.
+    """
+    return flask.jsonify(response_cache.info())
+
+EXPORT_PAGE_SIZE = 1000
+
+@app.route('/export/<path:query>')
+def export_node(query):
+    """
+    Stream every edge involving a URI, such as /c/en or /d/wordnet/3.0, as
+    newline-delimited JSON. The results are read from the backend a page at
+    a time, so the server's memory use doesn't grow with their number.
+
+    If Solr fails on the first page, the response is an error. If it fails
+    after the response has started, the last line is an object with an
+    'error' key instead of an edge, so that clients can tell the export is
+    incomplete.
+    """
+    req_args = flask.request.args
+    path = '/'+query.strip('/')
+    key = node_query_key(path)
+    if key is None:
+        flask.abort(404)
+    query_args = {key: path, 'filter': req_args.get('filter', '')}
+    if 'minWeight' in req_args:
+        query_args['minWeight'] = req_args.get('minWeight')
+    if 'fields' in req_args:
+        query_args['fields'] = req_args.get('fields')
+    fields = parse_fields(query_args)
+    if EDGE_STORE_FILE:
+        edges = export_edge_store(*edge_store_query(query_args))
+    else:
+        query_args['limit'] = str(EXPORT_PAGE_SIZE)
+        query_args['cursor'] = '*'
+        params = solr_params(query_args)
+        # Get the first page before the response starts, so that if Solr
+        # isn't working, the client gets an error status.
+        try:
+            first_page = solr.query(params)
+        except SolrError, error:
+            app.logger.error("Solr query failed: %s", error)
+            if error.status == 400:
+                flask.abort(400)
+            flask.abort(503)
+        edges = export_solr(params, first_page)
+    return flask.Response(flask.stream_with_context(export_lines(edges, fields)),
+                          mimetype='application/x-ndjson')
+
+def export_lines(edges, fields):
+    try:
+        for edge in edges:
+            if fields is not None:
+                edge = project_edge(edge, fields)
+            yield json.dumps(edge) + '\n'
+    except SolrError, error:
+        # The response has already started, so the status can't change.
+        app.logger.error("Solr query failed during export: %s", error)
+        yield json.dumps({'error': 'export interrupted',
+                          'details': str(error)}) + '\n'
+
+def export_edge_store(prefixes, min_weight):
+    store = get_edge_store()
+    if isinstance(store, EdgeStore):
+        # Sort the edges once, instead of once for each page.
+        for edge in store.iter_edges(prefixes, min_weight, EXPORT_PAGE_SIZE):
+            yield edge
+        return
+    cursor = None
+    while True:
+        count, edges, cursor = store.query_page(
+            prefixes, min_weight, cursor, EXPORT_PAGE_SIZE
+        )
+        for edge in edges:
+            yield edge
+        if cursor is None:
+            break
+
+def export_solr(params, obj):
+    """
+    Yield the edges from a page of Solr results, `obj`, and from the pages
+    after it.
+    """
+    while True:
+        for doc in obj['response']['docs']:
+            yield doc
+        next_cursor = obj.get('nextCursorMark')
+        if next_cursor is None or next_cursor == params['cursorMark']:
+            break
+        params['cursorMark'] = next_cursor
+        obj = solr.query(params)
 
 @app.route('/')
 def see_documentation():
@@ -207,16 +638,32 @@ def list_assoc(lang, termlist):
         flask.abort(400)
     return assoc_for_termlist(terms, commonsense_assoc)
 
-def assoc_for_termlist(terms, assoc):
+def assoc_args():
+    """
+    Get the 'limit' and 'filter' arguments of an assoc request.
+    """
     limit = flask.request.args.get('limit', '20')
     limit = int(limit)
     if limit > 1000: limit=20
 
     filter = flask.request.args.get('filter')
+    return limit, filter
+
+def assoc_for_termlist(terms, assoc):
+    limit, filter = assoc_args()
     def passes_filter(uri):
         return filter is None or uri.startswith(filter)
 
     vec = assoc.vector_from_terms(terms)
+    if filter and assoc_prefixes is not None:
+        # Only score the terms that can pass the filter.
+        similar = assoc_prefixes.similar_to_vector(assoc.assoc, vec, limit,
+                                                   filter)
+        return flask.jsonify({'terms': terms, 'similar': similar})
+    if assoc_clusters is not None:
+        similar = assoc_clusters.similar_to_vector(vec, limit, filter)
+        if similar is not None:
+            return flask.jsonify({'terms': terms, 'similar': similar})
     similar = assoc.terms_similar_to_vector(vec)
     similar = [item for item in similar if item[1] > 0 and
                passes_filter(item[0])][:limit]
@@ -229,9 +676,81 @@ def concept_assoc(uri):
     uri = '/' + uri.rstrip('/')
     if commonsense_assoc is None:
         flask.abort(404)
-    
+
+    # Single concepts can usually be looked up in the precomputed index.
+    if assoc_neighbors is not None:
+        limit, filter = assoc_args()
+        similar = assoc_neighbors.similar(uri, limit, filter)
+        if similar is not None:
+            return flask.jsonify({'terms': [(uri, 1.0)], 'similar': similar})
     return assoc_for_termlist([(uri, 1.0)], commonsense_assoc)
 
+MAX_BATCH_SIZE = 1000
+
+@app.route('/assoc/batch', methods=['POST'])
+def batch_assoc():
+    """
+    Find similar terms for many queries at once. The request body is a JSON
+    object such as:
+
+        {"queries": ["/c/en/dog", [["/c/en/cat", 1.0], ["/c/en/pet", 0.5]]],
+         "limit": 10, "filter": "/c/en/"}
+
+    where each query is a concept URI or a list of [URI, weight] pairs. The
+    response has a list of results, in the same order as the queries.
+    """
+    load_assoc()
+    if commonsense_assoc is None:
+        flask.abort(404)
+    try:
+        body = json.loads(flask.request.data)
+    except ValueError:
+        flask.abort(400)
+    if not isinstance(body, dict) or not isinstance(body.get('queries'), list):
+        flask.abort(400)
+    if len(body['queries']) > MAX_BATCH_SIZE:
+        flask.abort(413)
+    try:
+        limit = int(body.get('limit', 20))
+        queries = [parse_batch_query(query) for query in body['queries']]
+    except (TypeError, ValueError):
+        flask.abort(400)
+    if limit < 1 or limit > 1000: limit=20
+    filter = body.get('filter')
+    if filter is not None and not isinstance(filter, basestring):
+        flask.abort(400)
+
+    if not queries:
+        return flask.jsonify({'results': []})
+    vecs = np.vstack([commonsense_assoc.vector_from_terms(terms)
+                      for terms in queries])
+    rows = None
+    if filter:
+        rows = assoc_prefixes.rows(filter)
+    similar = similar_to_vectors(commonsense_assoc.assoc,
+                                 commonsense_assoc.labels, vecs, limit, rows)
+    return flask.jsonify({'results': [
+        {'terms': terms, 'similar': results}
+        for terms, results in zip(queries, similar)
+    ]})
+
+def parse_batch_query(query):
+    """
+    Turn one query from a batch into a list of (term, weight) pairs.
+    """
+    if isinstance(query, basestring):
+        return [(query, 1.0)]
+    terms = []
+    for item in query:
+        if isinstance(item, basestring):
+            terms.append((item, 1.0))
+        else:
+            term, weight = item
+            if not isinstance(term, basestring):
+                raise TypeError(term)
+            terms.append((term, float(weight)))
+    return terms
+
 if __name__ == '__main__':
     app.debug = True
     app.run('127.0.0.1', debug=True, port=8084)
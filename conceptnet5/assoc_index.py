@@ -0,0 +1,572 @@
+"""
+Indexes that answer the API's similarity queries over an AssocSpace without
+ranking every term in the space on every request.
+
+An AssocSpace's `assoc` matrix has one row per term, in the order of its
+`labels`, and the similarity of each term to a vector is the dot product of
+its row with that vector. That's what `terms_similar_to_vector` ranks by, and
+these indexes give the same scores.
+"""
+import os
+import numpy as np
+from bisect import bisect_left
+from conceptnet5.cache import LRUCache
+
+NEIGHBORS_FILE = 'neighbors.npy'
+NEIGHBOR_SCORES_FILE = 'neighbor_scores.npy'
+CLUSTER_CENTERS_FILE = 'cluster_centers.npy'
+CLUSTER_ORDER_FILE = 'cluster_order.npy'
+CLUSTER_OFFSETS_FILE = 'cluster_offsets.npy'
+ASSOC_MATRIX_FILE = 'assoc.npy'
+QUANTIZED_VALUES_FILE = 'assoc_int8.npy'
+QUANTIZED_SCALES_FILE = 'assoc_scales.npy'
+
+
+def assoc_shape(space):
+    """
+    Get the shape of an AssocSpace's `assoc` matrix, without computing the
+    matrix if it hasn't been computed yet.
+    """
+    return (len(space.labels), space.u.shape[1])
+
+
+def replace_assoc(space, matrix):
+    """
+    Make an AssocSpace use `matrix` as its `assoc` matrix, and return True if
+    it does. Some versions of AssocSpace compute `assoc` lazily and then store
+    it as an ordinary attribute, which can simply be replaced; others make it
+    a read-only property that stores the matrix it computes in `_assoc`.
+    """
+    try:
+        space.assoc = matrix
+    except AttributeError:
+        space._assoc = matrix
+    return space.assoc is matrix
+
+
+def save_assoc_matrix(space, dirname):
+    """
+    Save the `assoc` matrix of an AssocSpace by itself, so that servers can
+    memory-map it with `load_shared_assoc` instead of each computing their
+    own copy.
+    """
+    np.save(os.path.join(dirname, ASSOC_MATRIX_FILE),
+            np.ascontiguousarray(space.assoc))
+
+
+def load_shared_assoc(space, dirname):
+    """
+    Replace the `assoc` matrix of an AssocSpace with a read-only,
+    memory-mapped copy from `dirname`, if one was saved there for this space.
+    All the processes that map the same file share one copy of it in the
+    operating system's page cache. Returns True if the matrix was replaced.
+    """
+    filename = os.path.join(dirname, ASSOC_MATRIX_FILE)
+    if not os.path.exists(filename):
+        return False
+    assoc = np.load(filename, mmap_mode='r')
+    if assoc.shape != assoc_shape(space):
+        return False
+    return replace_assoc(space, assoc)
+
+
+class QuantizedMatrix(object):
+    """
+    A matrix stored as 8-bit integers, with a scale factor for each row, so
+    that it takes an eighth of the memory of a matrix of 64-bit floats.
+
+    It supports the operations on an AssocSpace's `assoc` matrix that the API
+    uses: getting rows, which are converted back to floats, and multiplying
+    by vectors or matrices, which converts `block_size` rows at a time.
+    """
+    def __init__(self, values, scales, block_size=65536):
+        self.values = values
+        self.scales = scales
+        self.block_size = block_size
+
+    @classmethod
+    def quantize(cls, matrix, block_size=65536):
+        """
+        Quantize each row of `matrix` so that its largest absolute value
+        becomes 127.
+        """
+        nrows = matrix.shape[0]
+        values = np.zeros(matrix.shape, dtype=np.int8)
+        scales = np.zeros((nrows,), dtype=np.float32)
+        for start in xrange(0, nrows, block_size):
+            end = min(start + block_size, nrows)
+            block = np.asarray(matrix[start:end], dtype=np.float64)
+            block_scales = np.abs(block).max(axis=1) / 127.
+            block_scales[block_scales == 0] = 1.
+            values[start:end] = np.round(block / block_scales[:, np.newaxis])
+            scales[start:end] = block_scales
+        return cls(values, scales, block_size)
+
+    def save(self, dirname):
+        np.save(os.path.join(dirname, QUANTIZED_VALUES_FILE), self.values)
+        np.save(os.path.join(dirname, QUANTIZED_SCALES_FILE), self.scales)
+
+    @classmethod
+    def load(cls, dirname):
+        """
+        Load a quantized matrix from `dirname`, memory-mapped, or return None
+        if there isn't one there.
+        """
+        values_file = os.path.join(dirname, QUANTIZED_VALUES_FILE)
+        scales_file = os.path.join(dirname, QUANTIZED_SCALES_FILE)
+        if not (os.path.exists(values_file) and os.path.exists(scales_file)):
+            return None
+        return cls(np.load(values_file, mmap_mode='r'), np.load(scales_file))
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.scales.nbytes
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    def __getitem__(self, key):
+        values = np.asarray(self.values[key], dtype=np.float32)
+        scales = self.scales[key]
+        if values.ndim == 1:
+            return values * scales
+        return values * scales[:, np.newaxis]
+
+    def dot(self, other):
+        other = np.asarray(other, dtype=np.float32)
+        nrows = self.values.shape[0]
+        result = np.zeros((nrows,) + other.shape[1:], dtype=np.float32)
+        for start in xrange(0, nrows, self.block_size):
+            end = min(start + self.block_size, nrows)
+            block = self.values[start:end].astype(np.float32).dot(other)
+            if block.ndim == 1:
+                result[start:end] = block * self.scales[start:end]
+            else:
+                result[start:end] = (block *
+                                     self.scales[start:end, np.newaxis])
+        return result
+
+
+def load_quantized_assoc(space, dirname):
+    """
+    Replace the `assoc` matrix of an AssocSpace with the QuantizedMatrix
+    saved in `dirname` by conceptnet5.builders.assoc_quantize, if there is
+    one for this space. Returns True if the matrix was replaced.
+    """
+    matrix = QuantizedMatrix.load(dirname)
+    if matrix is None or matrix.shape != assoc_shape(space):
+        return False
+    return replace_assoc(space, matrix)
+
+
+def top_n(scores, n):
+    """
+    Get the indices of the `n` highest values in a 1-D array, highest first,
+    without sorting the whole array.
+    """
+    if n <= 0:
+        return np.zeros((0,), dtype=np.int64)
+    if n < len(scores):
+        candidates = np.argpartition(-scores, n - 1)[:n]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='mergesort')]
+
+
+def top_n_rows(scores, n):
+    """
+    Like `top_n`, for each row of a 2-D array of scores.
+    """
+    rows = np.arange(scores.shape[0])[:, np.newaxis]
+    if n <= 0:
+        return np.zeros((scores.shape[0], 0), dtype=np.int64)
+    if n < scores.shape[1]:
+        candidates = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    else:
+        candidates = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+    order = np.argsort(-scores[rows, candidates], axis=1, kind='mergesort')
+    return candidates[rows, order]
+
+
+# Scoring a set of rows by copying them out of the matrix takes about four
+# times as long per row as multiplying the whole matrix in place, so past this
+# fraction of the rows, it's faster to score them all and keep the ones we
+# want.
+MAX_COPY_FRACTION = 0.2
+
+# Scoring a set of rows in place, one slice for each run of consecutive rows,
+# is only worth it if there are few enough runs.
+MAX_ROW_RUNS = 64
+
+
+def row_runs(rows):
+    """
+    Get the (start, stop) ranges of consecutive numbers in a sorted array of
+    row numbers.
+    """
+    if len(rows) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(rows)]])
+    return [(int(rows[start]), int(rows[stop - 1]) + 1)
+            for start, stop in zip(starts, stops)]
+
+
+def score_rows(assoc, rows, vecs):
+    """
+    Multiply only the given rows of the `assoc` matrix, a sorted array of row
+    numbers, by a vector or by a matrix with a column for each query.
+
+    Indexing the matrix with an array of rows copies them, so if the rows
+    make up a few runs of consecutive rows, the slices of those runs are
+    multiplied instead, and if they're a large fraction of the matrix, the
+    whole matrix is.
+    """
+    runs = row_runs(rows)
+    if not runs:
+        return np.zeros((0,) + vecs.shape[1:])
+    if len(runs) <= MAX_ROW_RUNS:
+        return np.concatenate([assoc[start:stop].dot(vecs)
+                               for start, stop in runs])
+    if len(rows) > MAX_COPY_FRACTION * assoc.shape[0]:
+        return assoc.dot(vecs)[rows]
+    return assoc[rows].dot(vecs)
+
+
+def similar_to_vectors(assoc, labels, vecs, limit, rows=None,
+                       block_size=100):
+    """
+    Find the terms most similar to each row of `vecs`, a matrix of query
+    vectors, using one matrix multiplication for each `block_size` queries.
+    Returns a list with up to `limit` (term, similarity) pairs for each
+    query, leaving out terms that don't have positive similarity.
+
+    If `rows` is given, only those rows of the `assoc` matrix are scored.
+    """
+    if rows is None:
+        limit = min(limit, assoc.shape[0])
+    else:
+        limit = min(limit, len(rows))
+    results = []
+    for start in xrange(0, vecs.shape[0], block_size):
+        # Multiply with the assoc matrix on the left, which also works for a
+        # QuantizedMatrix.
+        block = vecs[start:start + block_size].T
+        if rows is None:
+            sims = assoc.dot(block).T
+        else:
+            sims = score_rows(assoc, rows, block).T
+        top = top_n_rows(sims, limit)
+        for query in xrange(sims.shape[0]):
+            similar = []
+            for idx in top[query]:
+                score = sims[query, idx]
+                if score <= 0:
+                    break
+                if rows is not None:
+                    idx = rows[idx]
+                similar.append((labels[idx], float(score)))
+            results.append(similar)
+    return results
+
+
+def build_neighbors(space, k=100, block_size=1000):
+    """
+    Find the `k` most similar terms to every term in an AssocSpace. Returns
+    two arrays with a row for each term: the row numbers of its neighbors,
+    most similar first, and their similarities.
+
+    The similarities are computed `block_size` terms at a time, so that only
+    a block_size x N matrix of them is in memory at once.
+    """
+    assoc = space.assoc
+    nterms = assoc.shape[0]
+    k = min(k, nterms)
+    neighbors = np.zeros((nterms, k), dtype=np.int32)
+    # Keep the scores as precise as the ones computed for each query, so the
+    # API gives the same answer whichever way it finds them.
+    scores = np.zeros((nterms, k), dtype=np.float64)
+    for start in xrange(0, nterms, block_size):
+        end = min(start + block_size, nterms)
+        # Use the same query vectors that the API would make for each term.
+        vecs = np.vstack([
+            space.vector_from_terms([(space.labels[row], 1.0)])
+            for row in xrange(start, end)
+        ])
+        sims = vecs.dot(assoc.T)
+        top = top_n_rows(sims, k)
+        rows = np.arange(end - start)[:, np.newaxis]
+        neighbors[start:end] = top
+        scores[start:end] = sims[rows, top]
+    return neighbors, scores
+
+
+def save_neighbors(dirname, neighbors, scores):
+    np.save(os.path.join(dirname, NEIGHBORS_FILE), neighbors)
+    np.save(os.path.join(dirname, NEIGHBOR_SCORES_FILE), scores)
+
+
+class NeighborIndex(object):
+    """
+    Precomputed lists of the most similar terms to each term, made by
+    `build_neighbors`. The arrays are memory-mapped, so looking up a term
+    only reads its own row from disk, and processes that load the same files
+    share them in the page cache.
+    """
+    def __init__(self, labels, neighbors, scores):
+        self.labels = labels
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def load(cls, dirname, labels):
+        """
+        Load the index that was saved in `dirname` for a space with the given
+        labels. Returns None if there is no index there, or if it was built
+        for a different space.
+        """
+        neighbors_file = os.path.join(dirname, NEIGHBORS_FILE)
+        scores_file = os.path.join(dirname, NEIGHBOR_SCORES_FILE)
+        if not (os.path.exists(neighbors_file) and os.path.exists(scores_file)):
+            return None
+        neighbors = np.load(neighbors_file, mmap_mode='r')
+        scores = np.load(scores_file, mmap_mode='r')
+        if neighbors.shape[0] != len(labels):
+            return None
+        return cls(labels, neighbors, scores)
+
+    def similar(self, term, limit, filter=None):
+        """
+        Get up to `limit` (term, similarity) pairs for the terms most similar
+        to `term` that have positive similarity and start with `filter`, if
+        it's given.
+
+        Returns None if the index can't tell what the answer is, because the
+        term isn't in the index, or because too few of its precomputed
+        neighbors pass the filter. Then it's up to the caller to rank the
+        whole space.
+        """
+        try:
+            row = self.labels.index(term)
+        except (KeyError, ValueError):
+            return None
+        results = []
+        for idx, score in zip(self.neighbors[row], self.scores[row]):
+            if score <= 0:
+                # Nothing after this point would be included anyway.
+                return results
+            label = self.labels[idx]
+            if filter is None or label.startswith(filter):
+                results.append((label, float(score)))
+                if len(results) >= limit:
+                    return results
+        if self.neighbors.shape[1] >= len(self.labels):
+            # We've looked at every term in the space.
+            return results
+        return None
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt((matrix ** 2).sum(axis=1))
+    norms[norms == 0] = 1.
+    return matrix / norms[:, np.newaxis]
+
+
+def assign_clusters(vectors, centers, block_size=10000):
+    """
+    Get the number of the most similar center to each vector.
+    """
+    assignments = np.zeros((vectors.shape[0],), dtype=np.int32)
+    for start in xrange(0, vectors.shape[0], block_size):
+        end = min(start + block_size, vectors.shape[0])
+        assignments[start:end] = vectors[start:end].dot(centers.T).argmax(axis=1)
+    return assignments
+
+
+def find_clusters(vectors, nclusters, iterations=10, sample_size=100000,
+                  seed=0):
+    """
+    Find `nclusters` unit vectors that the rows of `vectors` cluster around,
+    by spherical k-means on a random sample of up to `sample_size` rows.
+    """
+    rng = np.random.RandomState(seed)
+    nrows = vectors.shape[0]
+    sample_rows = np.sort(rng.permutation(nrows)[:sample_size])
+    sample = np.asarray(vectors[sample_rows], dtype=np.float64)
+    centers = normalize_rows(sample[rng.permutation(len(sample))[:nclusters]])
+    for iteration in xrange(iterations):
+        assignments = assign_clusters(sample, centers)
+        for cluster in xrange(len(centers)):
+            members = sample[assignments == cluster]
+            # An empty cluster keeps its old center.
+            if len(members):
+                centers[cluster] = members.sum(axis=0)
+        centers = normalize_rows(centers)
+    return centers
+
+
+class ClusterIndex(object):
+    """
+    An approximate nearest-neighbor index over the rows of an AssocSpace,
+    using an inverted file of clusters: the rows are grouped by their most
+    similar cluster center, and a query only scores the rows in the
+    `nprobe` clusters whose centers are most similar to it.
+
+    More probes find more of the true nearest neighbors, and take longer.
+    With `nprobe` equal to the number of clusters, the search is exact.
+    """
+    def __init__(self, labels, assoc, centers, order, offsets, nprobe=8):
+        self.labels = labels
+        self.assoc = assoc
+        self.centers = centers
+        self.order = order
+        self.offsets = offsets
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, space, nclusters=None, iterations=10, nprobe=8):
+        """
+        Cluster the rows of an AssocSpace. By default there are about as many
+        clusters as the square root of the number of rows.
+        """
+        assoc = space.assoc
+        if nclusters is None:
+            nclusters = max(1, int(np.sqrt(assoc.shape[0])))
+        centers = find_clusters(assoc, nclusters, iterations)
+        assignments = assign_clusters(assoc, centers)
+        order = np.argsort(assignments, kind='mergesort').astype(np.int32)
+        counts = np.bincount(assignments, minlength=len(centers))
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(space.labels, assoc, centers, order, offsets, nprobe)
+
+    def save(self, dirname):
+        np.save(os.path.join(dirname, CLUSTER_CENTERS_FILE), self.centers)
+        np.save(os.path.join(dirname, CLUSTER_ORDER_FILE), self.order)
+        np.save(os.path.join(dirname, CLUSTER_OFFSETS_FILE), self.offsets)
+
+    @classmethod
+    def load(cls, dirname, space, nprobe=8):
+        """
+        Load the clusters that were saved in `dirname` for the given space.
+        Returns None if there are none, or if they were built for a different
+        space.
+        """
+        filenames = [
+            os.path.join(dirname, name) for name in
+            (CLUSTER_CENTERS_FILE, CLUSTER_ORDER_FILE, CLUSTER_OFFSETS_FILE)
+        ]
+        if not all(os.path.exists(filename) for filename in filenames):
+            return None
+        centers = np.load(filenames[0])
+        order = np.load(filenames[1], mmap_mode='r')
+        offsets = np.load(filenames[2])
+        if len(order) != len(space.labels):
+            return None
+        return cls(space.labels, space.assoc, centers, order, offsets, nprobe)
+
+    @property
+    def nclusters(self):
+        return len(self.centers)
+
+    def candidates(self, vec, nprobe=None):
+        """
+        Get the row numbers of the terms in the clusters nearest to `vec`.
+        """
+        if nprobe is None:
+            nprobe = self.nprobe
+        probe = top_n(self.centers.dot(vec), min(nprobe, self.nclusters))
+        return np.concatenate([
+            self.order[self.offsets[cluster]:self.offsets[cluster + 1]]
+            for cluster in probe
+        ])
+
+    def similar_to_vector(self, vec, limit, filter=None, nprobe=None):
+        """
+        Get up to `limit` (term, similarity) pairs for the terms most similar
+        to `vec` that have positive similarity and start with `filter`, if
+        it's given, searching only the nearest clusters.
+
+        Returns None if the clusters that were searched didn't have `limit`
+        such terms, but others might. Then it's up to the caller to rank the
+        whole space.
+        """
+        if nprobe is None:
+            nprobe = self.nprobe
+        rows = self.candidates(vec, nprobe)
+        rows.sort()
+        sims = self.assoc[rows].dot(vec)
+        results = []
+        for idx in np.argsort(-sims, kind='mergesort'):
+            score = sims[idx]
+            if score <= 0:
+                break
+            label = self.labels[rows[idx]]
+            if filter is None or label.startswith(filter):
+                results.append((label, float(score)))
+                if len(results) >= limit:
+                    return results
+        if nprobe >= self.nclusters:
+            return results
+        return None
+
+
+class PrefixIndex(object):
+    """
+    Finds the rows of an AssocSpace whose labels start with a given prefix,
+    such as '/c/en/', so that a filtered query only has to score those rows.
+
+    The labels are sorted once, so the labels with any prefix form a range
+    that can be found by binary search. The rows for each language are found
+    in advance, and the rows for other prefixes are cached as they're used.
+    """
+    def __init__(self, labels, cache_size=1000):
+        self.labels = labels
+        order = sorted(xrange(len(labels)), key=labels.__getitem__)
+        self.sorted_labels = [labels[row] for row in order]
+        self.order = np.array(order, dtype=np.int32)
+        self.language_rows = {}
+        self.cache = LRUCache(cache_size)
+        languages = set()
+        for label in self.sorted_labels:
+            parts = label.split(u'/', 3)
+            if len(parts) == 4 and parts[1] == u'c':
+                languages.add(u'/c/%s/' % parts[2])
+        for prefix in languages:
+            self.language_rows[prefix] = self._find_rows(prefix)
+
+    def _find_rows(self, prefix):
+        start = bisect_left(self.sorted_labels, prefix)
+        end = bisect_left(self.sorted_labels, prefix + u'\uffff')
+        # Rows in their original order read the matrix sequentially.
+        return np.sort(self.order[start:end])
+
+    def rows(self, prefix):
+        """
+        Get the row numbers of the labels that start with `prefix`, in order.
+        """
+        rows = self.language_rows.get(prefix)
+        if rows is None:
+            rows = self.cache.get(prefix)
+        if rows is None:
+            rows = self._find_rows(prefix)
+            self.cache.set(prefix, rows)
+        return rows
+
+    def similar_to_vector(self, assoc, vec, limit, prefix):
+        """
+        Get up to `limit` (term, similarity) pairs for the terms most similar
+        to `vec` that start with `prefix` and have positive similarity, by
+        scoring only those terms' rows of the `assoc` matrix.
+        """
+        rows = self.rows(prefix)
+        sims = score_rows(assoc, rows, vec)
+        return [
+            (self.labels[rows[idx]], float(sims[idx]))
+            for idx in top_n(sims, limit)
+            if sims[idx] > 0
+        ]
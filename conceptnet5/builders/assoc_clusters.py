@@ -0,0 +1,39 @@
+"""
+Cluster the terms in an AssocSpace, so that the API can search for terms
+similar to a list of terms without ranking the whole space.
+
+    python -m conceptnet5.builders.assoc_clusters assoc/assoc-space-5.2
+
+This writes cluster_centers.npy, cluster_order.npy and cluster_offsets.npy
+into the space's directory, where the API will find them. Use
+benchmarks.assoc_search to see how many clusters the API should search.
+"""
+import sys
+import time
+import argparse
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import ClusterIndex
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('assoc_dir', help='the directory of the AssocSpace')
+    parser.add_argument('-n', '--clusters', type=int,
+        help='the number of clusters (default: the square root of the number of terms)'
+    )
+    parser.add_argument('-i', '--iterations', type=int, default=10,
+        help='the number of iterations of k-means to run'
+    )
+    args = parser.parse_args()
+
+    start_time = time.time()
+    space = AssocSpace.load_dir(args.assoc_dir)
+    index = ClusterIndex.build(space, args.clusters, args.iterations)
+    index.save(args.assoc_dir)
+    print >> sys.stderr, 'grouped %d terms into %d clusters in %.1fs' % (
+        len(index.order), index.nclusters, time.time() - start_time
+    )
+
+
+if __name__ == '__main__':
+    run_args()
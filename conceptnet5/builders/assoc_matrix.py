@@ -0,0 +1,21 @@
+"""
+Save the assoc matrix of an AssocSpace in its own file, which the API
+memory-maps so that all of its worker processes share one copy.
+
+    python -m conceptnet5.builders.assoc_matrix assoc/assoc-space-5.2
+"""
+import argparse
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import save_assoc_matrix
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('assoc_dir', help='the directory of the AssocSpace')
+    args = parser.parse_args()
+    space = AssocSpace.load_dir(args.assoc_dir)
+    save_assoc_matrix(space, args.assoc_dir)
+
+
+if __name__ == '__main__':
+    run_args()
@@ -0,0 +1,38 @@
+"""
+Precompute the most similar terms to every term in an AssocSpace, so that
+the API can look up /assoc/<uri> without ranking the whole space.
+
+    python -m conceptnet5.builders.assoc_neighbors assoc/assoc-space-5.2 -k 100
+
+This writes neighbors.npy and neighbor_scores.npy into the space's
+directory, where the API will find them.
+"""
+import sys
+import time
+import argparse
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import build_neighbors, save_neighbors
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('assoc_dir', help='the directory of the AssocSpace')
+    parser.add_argument('-k', type=int, default=100,
+        help='the number of neighbors to keep for each term'
+    )
+    parser.add_argument('-b', '--block-size', type=int, default=1000,
+        help='the number of terms to compare to the whole space at a time'
+    )
+    args = parser.parse_args()
+
+    start_time = time.time()
+    space = AssocSpace.load_dir(args.assoc_dir)
+    neighbors, scores = build_neighbors(space, args.k, args.block_size)
+    save_neighbors(args.assoc_dir, neighbors, scores)
+    print >> sys.stderr, 'found %d neighbors of %d terms in %.1fs' % (
+        neighbors.shape[1], neighbors.shape[0], time.time() - start_time
+    )
+
+
+if __name__ == '__main__':
+    run_args()
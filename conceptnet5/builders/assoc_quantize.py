@@ -0,0 +1,30 @@
+"""
+Save an 8-bit quantized copy of the assoc matrix of an AssocSpace, which the
+API can serve from in an eighth of the memory.
+
+    python -m conceptnet5.builders.assoc_quantize assoc/assoc-space-5.2
+
+This writes assoc_int8.npy and assoc_scales.npy into the space's directory.
+The API uses them when CONCEPTNET_ASSOC_QUANTIZED is set. Use
+benchmarks.assoc_quantized to see how much the rankings change.
+"""
+import sys
+import argparse
+from assoc_space import AssocSpace
+from conceptnet5.assoc_index import QuantizedMatrix
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('assoc_dir', help='the directory of the AssocSpace')
+    args = parser.parse_args()
+    space = AssocSpace.load_dir(args.assoc_dir)
+    matrix = QuantizedMatrix.quantize(space.assoc)
+    matrix.save(args.assoc_dir)
+    print >> sys.stderr, 'quantized %d x %d matrix: %d bytes -> %d bytes' % (
+        matrix.shape[0], matrix.shape[1], space.assoc.nbytes, matrix.nbytes
+    )
+
+
+if __name__ == '__main__':
+    run_args()
@@ -0,0 +1,178 @@
+"""
+Build all the per-shard outputs of the assertion pipeline in one process
+pool, instead of running combine_assertions, json_to_csv, json_to_assoc and
+json_to_solr as separate programs on each shard.
+
+Each shard's edges are read and combined once, and every assertion is
+written to all four outputs while it's in memory:
+
+    edges/split/edges_07.csv -> assertions/part_07.jsons
+                                assertions/part_07.csv
+                                assoc/part_07.csv
+                                solr/part_07.json
+
+Run it from the data directory with:
+
+    python -m conceptnet5.builders.build_assertions edges/split/*.csv
+
+The Makefile runs it on one shard per rule, so that make can tell which
+shards need to be rebuilt.
+"""
+import errno
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+from collections import defaultdict
+from conceptnet5.edges import (MultiWriter, FlatEdgeWriter, CSVEdgeWriter,
+    AssocEdgeWriter, SolrEdgeWriter)
+from conceptnet5.builders.combine_assertions import iter_assertions
+from conceptnet5.builders.sort_edges import (external_sort, merge_unique,
+    DEFAULT_RUN_SIZE)
+
+STAGES = ['combine', 'json', 'csv', 'assoc', 'solr']
+
+
+def shard_name(csv_filename):
+    """
+    Get the name of a shard's outputs from the name of its input, turning
+    'edges/split/edges_07.csv' into 'part_07'.
+    """
+    name = os.path.splitext(os.path.basename(csv_filename))[0]
+    if name.startswith('edges_'):
+        name = 'part_' + name[len('edges_'):]
+    return name
+
+
+def assertion_writer(json_filename, output_csv, output_assoc, output_solr):
+    """
+    Get a MultiWriter that writes each assertion to a JSON file, a CSV file,
+    a file of associations and a Solr file, in the formats of
+    combine_assertions, json_to_csv, json_to_assoc and json_to_solr.
+    """
+    return MultiWriter(writers=[
+        FlatEdgeWriter(json_filename, ensure_ascii=False),
+        CSVEdgeWriter(output_csv),
+        AssocEdgeWriter(output_assoc),
+        SolrEdgeWriter(output_solr)
+    ])
+
+
+def build_shard(csv_filename, dataset, license, assertion_dir='assertions',
+                assoc_dir='assoc', solr_dir='solr', sort=True,
+                run_size=DEFAULT_RUN_SIZE):
+    """
+    Combine the edges in one shard into assertions, and write all the outputs
+    for those assertions. Returns the number of seconds spent in each stage.
+    """
+    name = shard_name(csv_filename)
+    timings = defaultdict(float)
+    input = open(csv_filename)
+    if sort:
+        lines = external_sort([input], run_size=run_size)
+    else:
+        lines = merge_unique([input])
+
+    writer = assertion_writer(
+        '%s/%s.jsons' % (assertion_dir, name),
+        output_csv='%s/%s.csv' % (assertion_dir, name),
+        output_assoc='%s/%s.csv' % (assoc_dir, name),
+        output_solr='%s/%s.json' % (solr_dir, name)
+    )
+    assertions = iter_assertions(lines, dataset, license)
+    while True:
+        start_time = time.time()
+        assertion = next(assertions, None)
+        timings['combine'] += time.time() - start_time
+        if assertion is None:
+            break
+        writer.write(assertion)
+
+    writer.close()
+    input.close()
+    timings.update(writer.timings)
+    return name, dict(timings)
+
+
+def _build_shard_task(args):
+    filename, kwargs = args
+    return build_shard(filename, **kwargs)
+
+
+def build_all(csv_filenames, dataset, license, workers=1, **kwargs):
+    """
+    Build the outputs for many shards at once, in a pool of `workers`
+    processes. Yields the name and timings of each shard as it finishes.
+    """
+    for dirname in (kwargs.get('assertion_dir', 'assertions'),
+                    kwargs.get('assoc_dir', 'assoc'),
+                    kwargs.get('solr_dir', 'solr')):
+        # Another build running in parallel may create it first.
+        try:
+            os.makedirs(dirname)
+        except OSError, error:
+            if error.errno != errno.EEXIST:
+                raise
+    kwargs.update(dataset=dataset, license=license)
+    tasks = [(filename, kwargs) for filename in csv_filenames]
+    if workers <= 1:
+        for task in tasks:
+            yield _build_shard_task(task)
+    else:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for result in pool.imap_unordered(_build_shard_task, tasks):
+                yield result
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+
+def report_timings(name, timings, out=sys.stderr):
+    total = sum(timings.values())
+    pieces = ['%s %.1fs' % (stage, timings.get(stage, 0.)) for stage in STAGES]
+    print >> out, '%s: %s (total %.1fs)' % (name, ', '.join(pieces), total)
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inputs', nargs='+', help='csv files of edges, one per shard')
+    parser.add_argument('-d', '--dataset', default='/d/conceptnet/5/combined-sa',
+        help='URI of the dataset to build'
+    )
+    parser.add_argument('-l', '--license', default='/l/CC/By-SA',
+        help='URI of the license to use'
+    )
+    parser.add_argument('-w', '--workers', type=int, default=multiprocessing.cpu_count(),
+        help='the number of shards to build at once'
+    )
+    parser.add_argument('--presorted', action='store_true',
+        help="the input files are already sorted, so don't sort them"
+    )
+    parser.add_argument('-r', '--run-size', type=int, default=DEFAULT_RUN_SIZE,
+        help='the number of lines to sort in memory at a time'
+    )
+    parser.add_argument('--assertion-dir', default='assertions')
+    parser.add_argument('--assoc-dir', default='assoc')
+    parser.add_argument('--solr-dir', default='solr')
+    args = parser.parse_args()
+
+    totals = defaultdict(float)
+    for name, timings in build_all(
+        args.inputs, args.dataset, args.license, workers=args.workers,
+        sort=not args.presorted, run_size=args.run_size,
+        assertion_dir=args.assertion_dir, assoc_dir=args.assoc_dir,
+        solr_dir=args.solr_dir
+    ):
+        report_timings(name, timings)
+        for stage, seconds in timings.items():
+            totals[stage] += seconds
+    report_timings('all shards', totals)
+
+
+if __name__ == '__main__':
+    run_args()
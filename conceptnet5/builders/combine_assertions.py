@@ -1,6 +1,8 @@
 import codecs
-from conceptnet5.edges import make_edge, MultiWriter
+from conceptnet5.edges import make_edge, FlatEdgeWriter
 from conceptnet5.nodes import make_disjunction_uri
+from conceptnet5.builders.sort_edges import (external_sort, merge_unique,
+    DEFAULT_RUN_SIZE)
 from collections import defaultdict
 from multiprocessing import Process
 import time
@@ -12,14 +14,47 @@ import math
 N = 100
 CURRENT_DIR = os.getcwd()
 
-def combine_assertions(csv_filename, out_filename, dataset, license):
+def combine_assertions(csv_filenames, out_filename, dataset, license,
+                       sort=False, run_size=DEFAULT_RUN_SIZE, workers=1):
+    """
+    Combine the edges in any number of tab-separated files into assertions.
+
+    Each file must already be sorted, as `sort_edges` sorts them, unless
+    `sort` is True, in which case they're sorted here using an external merge
+    sort with the given run size and workers. The sorted files are merged
+    into one stream, so edges for the same assertion can come from any of
+    them, and only a few lines from each are in memory at once.
+
+    The assertions are written as JSON to `out_filename`. To also write
+    them in other formats as they're combined, use
+    conceptnet5.builders.build_assertions.
+    """
+    if isinstance(csv_filenames, basestring):
+        csv_filenames = [csv_filenames]
+    inputs = [open(filename) for filename in csv_filenames]
+    if sort:
+        lines = external_sort(inputs, run_size=run_size, workers=workers)
+    else:
+        lines = merge_unique(inputs)
+    writer = FlatEdgeWriter(out_filename, ensure_ascii=False)
+    for assertion in iter_assertions(lines, dataset, license):
+        writer.write(assertion)
+    writer.close()
+    for input in inputs:
+        input.close()
+
+def iter_assertions(lines, dataset, license):
+    """
+    Read a sorted sequence of tab-separated edge lines, in UTF-8, and yield
+    the assertions they make up, as dictionaries.
+    """
     current_uri = None
     current_data = {}
     current_surface = None
     current_weight = 0.
     current_sources = []
-    out = codecs.open(out_filename, 'w', encoding='utf-8')
-    for line in codecs.open(csv_filename, encoding='utf-8'):
+    for line in lines:
+        line = line.decode('utf-8')
         uri, rel, start, end, context, weight, source_uri, id, this_dataset, surface = line.split('\t')[:10]
         weight = float(weight)
         surface = surface.strip()
@@ -32,7 +67,7 @@ def combine_assertions(csv_filename, out_filename, dataset, license):
                 current_surface = surface
         else:
             if current_uri is not None:
-                output_assertion(out,
+                yield make_assertion(
                     dataset=dataset, license=license,
                     sources=current_sources,
                     surfaceText=current_surface,
@@ -50,17 +85,17 @@ def combine_assertions(csv_filename, out_filename, dataset, license):
             current_sources = [source_uri]
             current_surface = surface or None
     
-    output_assertion(out,
-        rel=rel, start=start, end=end,
-        dataset=dataset, license=license,
-        sources=current_sources,
-        surfaceText=current_surface,
-        weight=current_weight,
-        uri=current_uri
-    )
-    out.close()
+    if current_uri is not None:
+        yield make_assertion(
+            dataset=dataset, license=license,
+            sources=current_sources,
+            surfaceText=current_surface,
+            weight=current_weight,
+            uri=current_uri,
+            **current_data
+        )
 
-def output_assertion(out, **kwargs):
+def make_assertion(**kwargs):
     uri = kwargs.pop('uri')
     source_tree = make_disjunction_uri(set(kwargs.pop('sources')))
     assertion = make_edge(sources=source_tree, **kwargs)
@@ -69,13 +104,14 @@ def output_assertion(out, **kwargs):
     assertion['weight'] = log_weight
     
     assert assertion['uri'] == uri, (assertion['uri'], uri)
-    line = json.dumps(assertion, ensure_ascii=False)
-    print >> out, line
+    return assertion
 
 if __name__ == '__main__':
     import argparse
     parser = argparse.ArgumentParser()
-    parser.add_argument('input', help='csv file of input')
+    parser.add_argument('inputs', nargs='+',
+        help='sorted csv files of input, to be merged together'
+    )
     parser.add_argument('output', help='jsons file to output to')
     parser.add_argument('-d', '--dataset',
         help='URI of the dataset to build, such as /d/conceptnet/5/combined-core'
@@ -83,6 +119,17 @@ if __name__ == '__main__':
     parser.add_argument('-l', '--license',
         help='URI of the license to use, such as /l/CC/By-SA'
     )
+    parser.add_argument('-s', '--sort', action='store_true',
+        help="sort the input first, if it isn't sorted already"
+    )
+    parser.add_argument('-r', '--run-size', type=int, default=DEFAULT_RUN_SIZE,
+        help='the number of lines to sort in memory at a time'
+    )
+    parser.add_argument('-w', '--workers', type=int, default=1,
+        help='the number of processes to sort with'
+    )
     args = parser.parse_args()
-    combine_assertions(args.input, args.output, args.dataset, args.license)
+    combine_assertions(args.inputs, args.output, args.dataset, args.license,
+                       sort=args.sort, run_size=args.run_size,
+                       workers=args.workers)
 
@@ -1,10 +1,44 @@
 import sys
+import struct
+import hashlib
 import argparse
 
 
+def stable_hash(text):
+    """
+    Get a 64-bit hash of a string that is the same in every Python process,
+    unlike the built-in `hash`, which can vary between interpreters and with
+    hash randomization.
+
+    This takes the first 8 bytes of an MD5 digest. We don't need MD5's
+    cryptographic properties, but hashlib computes it in C, so it's faster
+    than any hash we could write in Python.
+    """
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    return struct.unpack('<Q', hashlib.md5(text).digest()[:8])[0]
+
+
+def hash_partition(uri, n):
+    """
+    Assign a URI to one of `n` buckets by its stable hash.
+    """
+    return stable_hash(uri) % n
+
+
 class EdgeDistributor(object):
-    def __init__(self, output_dir, n):
+    """
+    Split tab-separated edges into `n` files, so that all the edges for the
+    same assertion URI end up in the same file.
+
+    `partition` is the function that takes in a URI and the number of files,
+    and returns the file number to put it in. The default is stable, so the
+    same edge goes to the same file in every build.
+    """
+    def __init__(self, output_dir, n, partition=hash_partition):
         self.n = n
+        self.partition = partition
+        self.counts = [0] * n
         self.files = [
             open(output_dir + '/edges_%02d.csv' % i, 'w')
             for i in range(n)
@@ -12,9 +46,27 @@ class EdgeDistributor(object):
 
     def handle_line(self, line):
         uri = line.split('\t')[0]
-        bucket = hash(uri) % self.n
+        bucket = self.partition(uri, self.n)
+        self.counts[bucket] += 1
         self.files[bucket].write(line)
 
+    def stats(self):
+        """
+        Describe how evenly the edges were distributed. 'skew' is the ratio
+        of the largest bucket to the average bucket, which is 1.0 when the
+        buckets are perfectly even.
+        """
+        total = sum(self.counts)
+        if total:
+            skew = max(self.counts) * self.n / float(total)
+        else:
+            skew = 1.0
+        return {
+            'counts': list(self.counts),
+            'total': total,
+            'skew': skew
+        }
+
     def close(self):
         for file in self.files:
             file.close()
@@ -24,6 +76,7 @@ def run_args():
     parser = argparse.ArgumentParser()
     parser.add_argument('-o', default='./split', help='the directory in which to write output files')
     parser.add_argument('-n', type=int, default=20, help='the number of separate files to write')
+    parser.add_argument('-q', '--quiet', action='store_true', help="don't report the number of edges in each file")
     args = parser.parse_args()
 
     sorter = EdgeDistributor(args.o, args.n)
@@ -31,8 +84,12 @@ def run_args():
         sorter.handle_line(line)
 
     sorter.close()
+    if not args.quiet:
+        stats = sorter.stats()
+        for i, count in enumerate(stats['counts']):
+            print >> sys.stderr, 'edges_%02d.csv: %d edges' % (i, count)
+        print >> sys.stderr, 'largest file / average file: %.3f' % stats['skew']
 
 
 if __name__ == '__main__':
     run_args()
-
@@ -0,0 +1,35 @@
+"""
+Build a PathIndex, a directory of sorted, memory-mapped indexes that the API
+can find edges in by prefixes of their path fields, from files of JSON
+assertions.
+
+    python -m conceptnet5.builders.json_to_path_index path_index assertions/*.jsons
+"""
+import sys
+import argparse
+from conceptnet5.path_index import build_path_index
+from conceptnet5.builders.sort_edges import DEFAULT_RUN_SIZE
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', help='the directory to build the index in')
+    parser.add_argument('inputs', nargs='*',
+        help='files of JSON assertions, one per line (default: standard input)'
+    )
+    parser.add_argument('-r', '--run-size', type=int, default=DEFAULT_RUN_SIZE,
+        help='the number of values to sort in memory at a time'
+    )
+    parser.add_argument('-T', '--tmpdir',
+        help='the directory for temporary files'
+    )
+    args = parser.parse_args()
+    if args.inputs:
+        streams = [open(filename, 'rb') for filename in args.inputs]
+    else:
+        streams = [sys.stdin]
+    build_path_index(streams, args.output, args.run_size, args.tmpdir)
+
+
+if __name__ == '__main__':
+    run_args()
@@ -0,0 +1,38 @@
+"""
+Build an EdgeStore, a SQLite file that the API can serve edges from without
+Solr, from files of JSON assertions.
+
+    python -m conceptnet5.builders.json_to_sqlite sqlite/edges.db assertions/*.jsons
+"""
+import json
+import sys
+import argparse
+from conceptnet5.edge_store import EdgeStore
+
+
+def read_edges(streams):
+    for stream in streams:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line.decode('utf-8'))
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('output', help='the SQLite file to build')
+    parser.add_argument('inputs', nargs='*',
+        help='files of JSON assertions, one per line (default: standard input)'
+    )
+    args = parser.parse_args()
+    if args.inputs:
+        streams = [open(filename) for filename in args.inputs]
+    else:
+        streams = [sys.stdin]
+    store = EdgeStore(args.output)
+    store.add_edges(read_edges(streams))
+    store.close()
+
+
+if __name__ == '__main__':
+    run_args()
@@ -0,0 +1,165 @@
+"""
+Sort lines of text and remove duplicates, using a bounded amount of memory.
+This replaces `sort | uniq` in the build process.
+
+The input is read in runs of `run_size` lines. Each run is sorted in memory
+and written to a temporary file, possibly by a pool of worker processes, and
+then the runs are merged together. Lines are compared as bytes, so the
+result doesn't depend on the locale, and every line with the same first
+column ends up next to the others.
+"""
+import sys
+import os
+import heapq
+import tempfile
+import argparse
+import multiprocessing
+from collections import deque
+
+DEFAULT_RUN_SIZE = 1000000
+
+
+def read_runs(streams, run_size):
+    """
+    Read lines from a sequence of streams, yielding lists of up to `run_size`
+    lines. Every line is made to end with a newline.
+    """
+    run = []
+    for stream in streams:
+        for line in stream:
+            if not line.endswith('\n'):
+                line += '\n'
+            run.append(line)
+            if len(run) >= run_size:
+                yield run
+                run = []
+    if run:
+        yield run
+
+
+def write_run(lines, tmpdir=None):
+    """
+    Sort a list of lines and write them to a new temporary file, returning
+    its filename.
+    """
+    lines.sort()
+    fd, filename = tempfile.mkstemp(suffix='.run', dir=tmpdir)
+    with os.fdopen(fd, 'wb') as out:
+        out.writelines(lines)
+    return filename
+
+
+def write_runs(runs, workers=1, tmpdir=None):
+    """
+    Sort and write each of the given runs to a temporary file, returning the
+    list of filenames. With more than one worker, runs are sorted in
+    parallel, with at most one extra run per worker waiting in memory.
+    """
+    if workers <= 1:
+        return [write_run(run, tmpdir) for run in runs]
+
+    filenames = []
+    pool = multiprocessing.Pool(workers)
+    pending = deque()
+    try:
+        for run in runs:
+            pending.append(pool.apply_async(write_run, (run, tmpdir)))
+            if len(pending) > workers:
+                filenames.append(pending.popleft().get())
+        while pending:
+            filenames.append(pending.popleft().get())
+        pool.close()
+    except:
+        pool.terminate()
+        for filename in filenames:
+            os.remove(filename)
+        raise
+    finally:
+        pool.join()
+    return filenames
+
+
+def merge_unique(iterables):
+    """
+    Merge sorted iterables of lines into one sorted sequence, leaving out
+    repeated lines.
+    """
+    previous = None
+    for line in heapq.merge(*iterables):
+        if line != previous:
+            yield line
+            previous = line
+
+
+def external_sort(streams, run_size=DEFAULT_RUN_SIZE, workers=1, tmpdir=None):
+    """
+    Yield the unique lines of a sequence of streams, in sorted order.
+
+    If the input fits in a single run, it's simply sorted in memory.
+    Otherwise, sorted runs are written to temporary files in `tmpdir` and
+    merged. The files are removed when the sort finishes.
+    """
+    runs = read_runs(streams, run_size)
+    first_run = next(runs, None)
+    if first_run is None:
+        return
+    second_run = next(runs, None)
+    if second_run is None:
+        first_run.sort()
+        for line in merge_unique([first_run]):
+            yield line
+        return
+
+    all_runs = _chain_runs(first_run, second_run, runs)
+    filenames = write_runs(all_runs, workers, tmpdir)
+    files = [open(filename, 'rb') for filename in filenames]
+    try:
+        for line in merge_unique(files):
+            yield line
+    finally:
+        for file, filename in zip(files, filenames):
+            file.close()
+            os.remove(filename)
+
+
+def _chain_runs(first_run, second_run, runs):
+    yield first_run
+    yield second_run
+    for run in runs:
+        yield run
+
+
+def run_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('inputs', nargs='*',
+        help='files to sort (default: standard input)'
+    )
+    parser.add_argument('-o', '--output',
+        help='the file to write to (default: standard output)'
+    )
+    parser.add_argument('-r', '--run-size', type=int, default=DEFAULT_RUN_SIZE,
+        help='the number of lines to sort in memory at a time'
+    )
+    parser.add_argument('-w', '--workers', type=int, default=1,
+        help='the number of processes to sort runs with'
+    )
+    parser.add_argument('-T', '--tmpdir',
+        help='the directory for temporary files'
+    )
+    args = parser.parse_args()
+
+    if args.inputs:
+        streams = [open(filename, 'rb') for filename in args.inputs]
+    else:
+        streams = [sys.stdin]
+    if args.output:
+        out = open(args.output, 'wb')
+    else:
+        out = sys.stdout
+    out.writelines(external_sort(streams, args.run_size, args.workers,
+                                 args.tmpdir))
+    out.close()
+
+
+if __name__ == '__main__':
+    run_args()
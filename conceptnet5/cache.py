@@ -0,0 +1,339 @@
+"""
+Caches used to avoid repeating expensive work, such as normalizing the same
+concept text over and over while reading a dataset. LRUCache and TTLCache live
+in memory; PersistentCache lives on disk and can be shared between processes;
+MemcacheCache lives in a memcached server and can be shared between machines.
+"""
+
+from collections import OrderedDict
+import hashlib
+import socket
+import sqlite3
+import json
+import time
+import os
+
+
+class LRUCache(object):
+    """
+    A dictionary-like cache that holds at most `maxsize` entries, discarding
+    the least recently used entry when it fills up.
+
+    It keeps count of its hits and misses, so that you can find out how much
+    work it's saving you.
+    """
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        # Re-insert the value so that it becomes the most recently used.
+        self.data[key] = value
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        if key in self.data:
+            del self.data[key]
+        elif len(self.data) >= self.maxsize:
+            self.data.popitem(last=False)
+        self.data[key] = value
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """
+        Return a dictionary describing how well the cache is doing.
+        """
+        lookups = self.hits + self.misses
+        if lookups:
+            hit_rate = float(self.hits) / lookups
+        else:
+            hit_rate = 0.
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate,
+            'size': len(self.data),
+            'maxsize': self.maxsize
+        }
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose entries also expire `ttl` seconds after they're set,
+    for caching things that can change, such as the results of a query.
+
+    Values can vary a lot in size, so the cache can also be limited to
+    `maxbytes`, as measured by calling `sizeof` on each value. Values bigger
+    than that aren't cached at all.
+    """
+    def __init__(self, maxsize=100000, ttl=300., clock=time.time,
+                 maxbytes=None, sizeof=None):
+        LRUCache.__init__(self, maxsize)
+        self.ttl = ttl
+        self.clock = clock
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+
+    def get(self, key, default=None):
+        try:
+            entry = self.data.pop(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        expires, value, size = entry
+        if expires <= self.clock():
+            # Leave the expired entry out of the cache.
+            self.nbytes -= size
+            self.misses += 1
+            return default
+        self.data[key] = entry
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        size = 0
+        if self.sizeof is not None:
+            size = self.sizeof(value)
+        old = self.data.pop(key, None)
+        if old is not None:
+            self.nbytes -= old[2]
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self.data[key] = (self.clock() + ttl, value, size)
+        self.nbytes += size
+        while len(self.data) > self.maxsize or (
+            self.maxbytes is not None and self.nbytes > self.maxbytes
+        ):
+            self.nbytes -= self.data.popitem(last=False)[1][2]
+
+    def __contains__(self, key):
+        entry = self.data.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def clear(self):
+        LRUCache.clear(self)
+        self.nbytes = 0
+
+    def info(self):
+        info = LRUCache.info(self)
+        info['ttl'] = self.ttl
+        info['bytes'] = self.nbytes
+        info['maxbytes'] = self.maxbytes
+        return info
+
+
+class MemcacheCache(object):
+    """
+    A cache of JSON-serializable values in a memcached server at `address`
+    ('host:port'), so that many processes, even on different machines, can
+    share it. Entries expire after `ttl` seconds, and memcached evicts the
+    least recently used ones when it runs out of memory.
+
+    Keys can be any string: they're hashed, so they fit memcached's limits on
+    key length and characters. `namespace` keeps keys for different purposes
+    apart.
+
+    Like PersistentCache, this is only an optimization: if the server can't
+    be reached, lookups miss and new entries are dropped.
+    """
+    def __init__(self, address, namespace='', ttl=300, timeout=0.5):
+        host, port = address.rsplit(':', 1)
+        self.host = host
+        self.port = int(port)
+        self.namespace = namespace
+        self.ttl = int(ttl)
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.sock = None
+        self.reader = None
+
+    def _key(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return self.namespace + hashlib.md5(key).hexdigest()
+
+    def _connect(self):
+        if self.sock is None:
+            self.sock = socket.create_connection((self.host, self.port),
+                                                 self.timeout)
+            self.reader = self.sock.makefile('rb')
+        return self.sock
+
+    def _disconnect(self):
+        if self.sock is not None:
+            self.reader.close()
+            self.sock.close()
+        self.sock = None
+        self.reader = None
+
+    def _read_line(self):
+        line = self.reader.readline()
+        if not line.endswith('\r\n'):
+            raise socket.error('connection closed by memcached')
+        return line[:-2]
+
+    def get(self, key, default=None):
+        key = self._key(key)
+        try:
+            self._connect().sendall('get %s\r\n' % key)
+            line = self._read_line()
+            value = None
+            if line.startswith('VALUE '):
+                length = int(line.split()[3])
+                value = self.reader.read(length + 2)[:-2]
+                line = self._read_line()
+            if line != 'END':
+                raise socket.error('unexpected reply from memcached: %r' % line)
+        except (socket.error, ValueError, IndexError):
+            self._disconnect()
+            self.errors += 1
+            value = None
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+        data = json.dumps(value)
+        command = 'set %s 0 %d %d\r\n%s\r\n' % (self._key(key), ttl,
+                                                  len(data), data)
+        try:
+            self._connect().sendall(command)
+            self._read_line()
+        except socket.error:
+            self._disconnect()
+            self.errors += 1
+
+    def close(self):
+        self._disconnect()
+
+    def info(self):
+        lookups = self.hits + self.misses
+        if lookups:
+            hit_rate = float(self.hits) / lookups
+        else:
+            hit_rate = 0.
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': hit_rate,
+            'errors': self.errors,
+            'ttl': self.ttl,
+            'server': '%s:%d' % (self.host, self.port)
+        }
+
+
+class PersistentCache(object):
+    """
+    A cache of strings stored in a SQLite file, so that it lasts between runs
+    and can be shared by many processes at once.
+
+    Any number of processes can read from the file at the same time. New
+    entries are buffered and written in batches of `batch_size`, so that
+    writers rarely have to wait for each other. Call `flush()` (or `close()`)
+    to make sure buffered entries reach the disk.
+
+    The cache is only an optimization, so if the database stays locked by
+    another process for too long, buffered entries are simply dropped.
+    """
+    def __init__(self, filename, namespace='', batch_size=1000, timeout=30.):
+        dirname = os.path.dirname(filename)
+        if dirname and not os.path.exists(dirname):
+            try:
+                os.makedirs(dirname)
+            except OSError:
+                # Another process may have created it in the meantime.
+                if not os.path.isdir(dirname):
+                    raise
+        self.filename = filename
+        self.namespace = namespace
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.pending = {}
+        self.db = self._connect()
+
+    def _connect(self):
+        db = sqlite3.connect(self.filename, timeout=self.timeout)
+        # Write-ahead logging lets readers proceed while another process is
+        # writing.
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'namespace TEXT, key TEXT, value TEXT, '
+            'PRIMARY KEY (namespace, key))'
+        )
+        db.commit()
+        return db
+
+    def reopen(self):
+        """
+        Open a new connection to the database, for use in a process that was
+        forked from the one that opened this cache. SQLite connections can't
+        be shared across a fork. Unwritten entries are left for the original
+        process to write.
+        """
+        self.pending = {}
+        self.db = self._connect()
+
+    def get(self, key, default=None):
+        if key in self.pending:
+            return self.pending[key]
+        row = self.db.execute(
+            'SELECT value FROM cache WHERE namespace=? AND key=?',
+            (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def set(self, key, value):
+        self.pending[key] = value
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        rows = [(self.namespace, key, value)
+                for key, value in self.pending.iteritems()]
+        self.pending = {}
+        try:
+            with self.db:
+                self.db.executemany(
+                    'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)', rows
+                )
+        except sqlite3.OperationalError:
+            # The database stayed locked. Losing these entries only means
+            # they'll be computed again next time.
+            pass
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -0,0 +1,235 @@
+"""
+A store of edges in a local SQLite file, which can answer the same path
+queries that the API sends to Solr, for deployments that don't run Solr.
+
+Every edge is stored as its JSON text, and each of the path fields that the
+API can search on has an index of the values it takes on each edge, so that
+looking up the edges whose field starts with a prefix is a range scan of the
+index.
+
+Like Solr's path queries, a prefix matches whole path components: /c/en/dog
+matches /c/en/dog and /c/en/dog/n/pet, but not /c/en/doghouse.
+
+Build a store from files of assertions with
+conceptnet5.builders.json_to_sqlite.
+"""
+import sqlite3
+import json
+
+# The fields that the store can search by prefix, like the path fields that
+# the API queries in Solr. 'nodes' matches an edge's start, end or relation.
+PATH_FIELDS = ['id', 'uri', 'rel', 'start', 'end', 'dataset', 'license',
+               'nodes', 'context', 'sources']
+
+
+def index_values(edge):
+    """
+    Get the (field, value) pairs that an edge should be found by.
+    """
+    pairs = []
+    for field in PATH_FIELDS:
+        if field == 'nodes':
+            for node_field in ('start', 'end', 'rel'):
+                pairs.append((field, edge[node_field]))
+        elif field == 'sources':
+            sources = edge['sources']
+            pairs.append((field, sources))
+            # Also find the edge by each of the sources that the source tree
+            # is made of.
+            for piece in sources.replace(u'[', u',').replace(u']', u',').split(u','):
+                piece = piece.strip(u'/')
+                if piece.startswith(u's/'):
+                    pairs.append((field, u'/' + piece))
+        elif edge.get(field) is not None:
+            pairs.append((field, edge[field]))
+    return sorted(set(pairs))
+
+
+def path_prefix(prefix):
+    """
+    Get the form of a path prefix that values are compared to, without a
+    trailing slash.
+    """
+    return prefix.rstrip(u'/')
+
+
+def path_bounds(prefix):
+    """
+    Get the range of values that are below a path prefix, such as the values
+    starting with '/c/en/dog/' for '/c/en/dog'. They're at least `prefix`
+    plus '/', and less than `prefix` plus '0', the next character after '/'.
+    """
+    return prefix + u'/', prefix + u'0'
+
+
+def path_matches(value, prefix):
+    """
+    Check whether a value is `prefix`, or is below it in the path hierarchy.
+    The prefix should come from `path_prefix`.
+    """
+    return value == prefix or value.startswith(prefix + u'/')
+
+
+class EdgeStore(object):
+    """
+    A SQLite file of edges, indexed by their path fields.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        self._setup()
+
+    def _setup(self):
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS edges ('
+            'id INTEGER PRIMARY KEY, weight REAL, data TEXT)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS edge_index ('
+            'field TEXT, value TEXT, edge INTEGER)'
+        )
+        self.db.commit()
+
+    def add_edges(self, edges, batch_size=10000):
+        """
+        Add a sequence of edges to the store. Indexes are built afterward,
+        which is much faster than updating them as each edge is added.
+        """
+        self.db.execute('DROP INDEX IF EXISTS edge_index_lookup')
+        self.db.execute('DROP INDEX IF EXISTS edges_weight')
+        self.db.execute('DROP INDEX IF EXISTS edges_weight_id')
+        next_id = self.db.execute(
+            'SELECT COALESCE(MAX(id), 0) + 1 FROM edges'
+        ).fetchone()[0]
+        edge_rows = []
+        index_rows = []
+        for edge in edges:
+            edge_rows.append((next_id, edge['weight'],
+                              json.dumps(edge, ensure_ascii=False)))
+            for field, value in index_values(edge):
+                index_rows.append((field, value, next_id))
+            next_id += 1
+            if len(edge_rows) >= batch_size:
+                self._insert(edge_rows, index_rows)
+                edge_rows = []
+                index_rows = []
+        self._insert(edge_rows, index_rows)
+        self.db.execute(
+            'CREATE INDEX edge_index_lookup ON edge_index (field, value, edge)'
+        )
+        # Edges are listed by descending weight, then by ID.
+        self.db.execute(
+            'CREATE INDEX edges_weight_id ON edges (weight DESC, id)'
+        )
+        self.db.commit()
+
+    def _insert(self, edge_rows, index_rows):
+        with self.db:
+            self.db.executemany('INSERT INTO edges VALUES (?, ?, ?)', edge_rows)
+            self.db.executemany('INSERT INTO edge_index VALUES (?, ?, ?)',
+                                index_rows)
+
+    def _where(self, prefixes, min_weight):
+        clauses = []
+        values = []
+        if isinstance(prefixes, dict):
+            prefixes = sorted(prefixes.items())
+        for field, prefix in prefixes:
+            if field not in PATH_FIELDS:
+                raise ValueError('Unknown field: %s' % field)
+            prefix = path_prefix(prefix)
+            lower, upper = path_bounds(prefix)
+            clauses.append(
+                'id IN (SELECT edge FROM edge_index '
+                'WHERE field=? AND (value=? OR (value>=? AND value<?)))'
+            )
+            values.extend([field, prefix, lower, upper])
+        if min_weight is not None:
+            clauses.append('weight >= ?')
+            values.append(min_weight)
+        if not clauses:
+            return '', values
+        return ' WHERE ' + ' AND '.join(clauses), values
+
+    def query(self, prefixes, min_weight=None, offset=0, limit=50):
+        """
+        Find the edges whose fields start with the given prefixes, a
+        dictionary from field names to prefixes, such as
+        {'nodes': '/c/en/dog'}, or a list of (field, prefix) pairs. Returns
+        the total number of such edges, and a list of the edges from `offset`
+        to `offset + limit`, highest weight first.
+        """
+        where, values = self._where(prefixes, min_weight)
+        count = self.db.execute(
+            'SELECT COUNT(*) FROM edges' + where, values
+        ).fetchone()[0]
+        rows = self.db.execute(
+            'SELECT data FROM edges' + where +
+            ' ORDER BY weight DESC, id LIMIT ? OFFSET ?',
+            values + [limit, offset]
+        )
+        return count, [json.loads(row[0]) for row in rows]
+
+    def query_page(self, prefixes, min_weight=None, cursor=None, limit=50):
+        """
+        Get a page of up to `limit` edges for a query, starting from `cursor`,
+        which is None for the first page. Returns the total number of edges,
+        the page of edges, and the cursor for the next page, which is None
+        after the last page. Counting the edges takes as long as finding them
+        all, so the count is only returned for the first page, and is None
+        on later pages.
+
+        The cursor is the weight and row ID of the last edge on the previous
+        page. A query with no prefixes seeks to it in the weight index. A
+        query with prefixes looks up its edges in the path index instead,
+        and only sorts the ones after the cursor, so its later pages get
+        faster, but they still take time in proportion to the number of
+        edges that match.
+        """
+        where, values = self._where(prefixes, min_weight)
+        count = None
+        if cursor is None:
+            count = self.db.execute(
+                'SELECT COUNT(*) FROM edges' + where, values
+            ).fetchone()[0]
+        else:
+            weight, id = cursor
+            if where:
+                where += ' AND '
+            else:
+                where = ' WHERE '
+            # The first condition is the one that can use the index.
+            where += 'weight <= ? AND (weight < ? OR id > ?)'
+            values = values + [weight, weight, id]
+        rows = self.db.execute(
+            'SELECT id, weight, data FROM edges' + where +
+            ' ORDER BY weight DESC, id LIMIT ?',
+            values + [limit]
+        ).fetchall()
+        edges = [json.loads(row[2]) for row in rows]
+        next_cursor = None
+        if rows and len(rows) == limit:
+            next_cursor = [rows[-1][1], rows[-1][0]]
+        return count, edges, next_cursor
+
+    def iter_edges(self, prefixes, min_weight=None, batch_size=1000):
+        """
+        Iterate over all the edges for a query, highest weight first. They're
+        found and sorted once, by a single query, and read from it
+        `batch_size` at a time.
+        """
+        where, values = self._where(prefixes, min_weight)
+        rows = self.db.execute(
+            'SELECT data FROM edges' + where + ' ORDER BY weight DESC, id',
+            values
+        )
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                yield json.loads(row[0])
+
+    def close(self):
+        self.db.close()
+
@@ -1,7 +1,11 @@
+# -*- coding: utf-8 -*-
 from conceptnet5.nodes import (list_to_uri_piece, uri_piece_to_list,
     make_assertion_uri, normalize_uri, make_concept_uri, concept_to_lemmas,
     make_conjunction_uri, make_disjunction_uri)
 from hashlib import sha1
+from collections import defaultdict
+import time
+from json.encoder import encode_basestring, encode_basestring_ascii
 import json, os
 
 def make_edge(rel, start, end,
@@ -39,6 +43,149 @@ def make_edge(rel, start, end,
     return obj
 
 
+def edge_to_csv_line(info):
+    """
+    Get the tab-separated line of text that represents an edge, as Unicode.
+    """
+    text = info.get(u'surfaceText') or ''
+    return u"%(uri)s\t%(rel)s\t%(start)s\t%(end)s\t%(context)s\t%(weight)s\t%(sources)s\t%(id)s\t%(dataset)s\t%(text)s" % {
+        'uri': info[u'uri'],
+        'rel': info[u'rel'],
+        'start': info[u'start'],
+        'end': info[u'end'],
+        'context': info[u'context'],
+        'weight': info[u'weight'],
+        'sources': info[u'sources'],
+        'id': info[u'id'],
+        'text': text,
+        'dataset': info[u'dataset'],
+    }
+
+
+def reduce_concept(concept):
+    parts = concept.split(u'/')
+    # Unify simplified and traditional Chinese in associations.
+    if parts[2] == 'zh_CN' or parts[2] == 'zh_TW':
+        parts[2] = 'zh'
+    return u'/'.join(parts[:4])
+
+
+def assoc_lines(info):
+    """
+    Get the tab-separated lines of associations between concepts that an
+    assertion implies, as Unicode. Some assertions imply none.
+    """
+    startc = reduce_concept(info[u'start'])
+    endc = reduce_concept(info[u'end'])
+    rel = info[u'rel']
+    weight = info[u'weight']
+
+    if u'dbpedia' in info[u'sources'] and u'/or/' not in info[u'sources']:
+        # DBPedia associations are still too numerous and too weird to
+        # associate.
+        return []
+
+    pairs = []
+    if startc == u'/c/en/person':
+        if rel == u'/r/Desires':
+            pairs = [(u'/c/en/good', endc), (u'/c/en/bad/neg', endc)]
+        elif rel == u'/r/NotDesires':
+            pairs = [(u'/c/en/bad', endc), (u'/c/en/good/neg', endc)]
+        else:
+            pairs = [(startc, endc)]
+    elif startc == u'/c/zh/人':
+        if rel == u'/r/Desires':
+            pairs = [(u'/c/zh/良好', endc), (u'/c/zh/不良/neg', endc)]
+        elif rel == '/r/NotDesires':
+            pairs = [(u'/c/zh/良好/neg', endc), (u'/c/zh/不良', endc)]
+        else:
+            pairs = [(startc, endc)]
+    else:
+        negated = (rel.startswith(u'/r/Not') or rel.startswith(u'/r/Antonym'))
+        if not negated:
+            pairs = [(startc, endc)]
+        else:
+            pairs = [(startc, endc + u'/neg'), (startc + u'/neg', endc)]
+
+    return [
+        u"%(start)s\t%(end)s\t%(weight)s" % {
+            u'start': start,
+            u'end': end,
+            u'weight': weight,
+        }
+        for (start, end) in pairs
+    ]
+
+
+def project_edge(edge, fields):
+    """
+    Get a copy of an edge with only the given fields, for API clients that
+    don't need the rest. Fields that the edge doesn't have are left out.
+    """
+    return dict((field, edge[field]) for field in fields if field in edge)
+
+
+# The keys of the dictionaries that make_edge produces, in the order that
+# encode_edge writes them.
+EDGE_KEYS = ['id', 'uri', 'rel', 'start', 'end', 'context', 'dataset',
+             'sources', 'features', 'license', 'weight', 'surfaceText']
+EDGE_STRING_KEYS = ['id', 'uri', 'rel', 'start', 'end', 'context', 'dataset',
+                    'sources']
+EDGE_KEY_SET = frozenset(EDGE_KEYS)
+
+def encode_edge(edge, ensure_ascii=True):
+    """
+    Encode an edge as a line of JSON. This does the same thing as
+    `json.dumps(edge, ensure_ascii=ensure_ascii)`, but much faster, because
+    it knows what keys and values to expect in an edge from `make_edge`.
+
+    Anything that doesn't look like such an edge is passed on to json.dumps.
+    """
+    if len(edge) != len(EDGE_KEYS) or not EDGE_KEY_SET.issuperset(edge):
+        return json.dumps(edge, ensure_ascii=ensure_ascii)
+    if ensure_ascii:
+        encode_string = encode_basestring_ascii
+    else:
+        encode_string = _encode_unicode
+    try:
+        parts = ['"%s": %s' % (key, encode_string(edge[key]))
+                 for key in EDGE_STRING_KEYS]
+        parts.append('"features": [%s]' % ', '.join(
+            [encode_string(feature) for feature in edge['features']]
+        ))
+        parts.append('"license": %s' % encode_string(edge['license']))
+        parts.append('"weight": %s' % _encode_number(edge['weight']))
+        surface = edge['surfaceText']
+        if surface is None:
+            parts.append('"surfaceText": null')
+        else:
+            parts.append('"surfaceText": %s' % encode_string(surface))
+    except TypeError:
+        # Some value wasn't a string or number.
+        return json.dumps(edge, ensure_ascii=ensure_ascii)
+    return '{%s}' % ', '.join(parts)
+
+def _encode_unicode(text):
+    # The ASCII encoder is written in C, while the Unicode one is written in
+    # Python. Most of our strings are ASCII anyway, so try the fast one first.
+    encoded = encode_basestring_ascii(text)
+    if '\\u' not in encoded:
+        return encoded
+    if isinstance(text, str):
+        text = text.decode('utf-8')
+    return encode_basestring(text)
+
+def _encode_number(value):
+    if isinstance(value, float):
+        # json.dumps has special spellings for infinity and NaN.
+        if value != value or value in (float('inf'), float('-inf')):
+            return json.dumps(value)
+        return repr(value)
+    elif isinstance(value, (int, long)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(value)
+
+
 class FlatEdgeWriter(object):
     """
     This class and its subclasses give you objects you can use to write
@@ -46,15 +193,25 @@ class FlatEdgeWriter(object):
     into databases that allow you to search them.
 
     The default behavior is simply to write the JSON data to a file, one entry
-    per line, without any additional indexing information.
+    per line, without any additional indexing information. Lines are written
+    in batches of `buffer_size`, so make sure to `close()` the writer when
+    you're done.
+
+    With `ensure_ascii=False`, non-ASCII characters are written as UTF-8 to
+    a file given by name, or as Unicode to a stream you pass in.
     """
-    def __init__(self, file):
+    format = 'json'
+
+    def __init__(self, file, ensure_ascii=True, buffer_size=1000):
         self.filename = None
         if isinstance(file, basestring):
             self.out = open(file, 'w')
             self.filename = file
         else:
             self.out = file
+        self.ensure_ascii = ensure_ascii
+        self.buffer_size = buffer_size
+        self.buffer = []
         self.open = True
         self.write_header()
 
@@ -65,21 +222,62 @@ class FlatEdgeWriter(object):
         pass
 
     def write(self, edge):
-        line = json.dumps(edge)
-        print >> self.out, line
+        self.buffer.append(encode_edge(edge, self.ensure_ascii))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.buffer.append('')
+            text = '\n'.join(self.buffer)
+            if isinstance(text, unicode) and self.filename is not None:
+                text = text.encode('utf-8')
+            self.out.write(text)
+            self.buffer = []
 
     def close(self):
+        self.flush()
         self.write_footer()
         if self.filename is not None:
             self.out.close()
         self.open = False
 
+    def __del__(self):
+        if getattr(self, 'open', False):
+            self.close()
+
+class CSVEdgeWriter(FlatEdgeWriter):
+    """
+    Write edges as lines of tab-separated values, in the same format as
+    `json_to_csv`.
+    """
+    format = 'csv'
+
+    def write(self, edge):
+        self.buffer.append(edge_to_csv_line(edge))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+class AssocEdgeWriter(FlatEdgeWriter):
+    """
+    Write the associations between concepts that each edge implies, in the
+    same format as `json_to_assoc`.
+    """
+    format = 'assoc'
+
+    def write(self, edge):
+        self.buffer.extend(assoc_lines(edge))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
 class SolrEdgeWriter(FlatEdgeWriter):
     """
     Write a JSON dictionary with a repeated 'add' key, once for each edge,
     and a 'commit' key at the end. This is a format that Solr is good at
     importing.
     """
+    format = 'solr'
+
     def write_header(self):
         print >> self.out, '{'
 
@@ -105,23 +303,37 @@ class SolrEdgeWriter(FlatEdgeWriter):
         self.out.write(json_struct[2:-2]+',\n')
 
 class MultiWriter(object):
-    def __init__(self, basename, flat_dir='data/flat', solr_dir='data/solr', isTest=False):
-        flat_file_path = '%s/%s.json' % (flat_dir, basename)
-        solr_file_path = '%s/%s.json' % (solr_dir, basename)
+    """
+    Write each edge to several writers at once, such as a FlatEdgeWriter and
+    a SolrEdgeWriter, so that one pass over the edges produces all their
+    output formats.
 
-        if isTest:
-            flat_file_path = 'data/flat_test/%s.json' % basename
-            solr_file_path = 'data/solr_test/%s.json' % basename
+    By default, this writes flat JSON and Solr files named after `basename`.
+    Pass a list of `writers` to write to those instead.
 
-        self.flat_writer = FlatEdgeWriter(flat_file_path)
-        self.solr_writer = SolrEdgeWriter(solr_file_path)
-        self.writers = [self.flat_writer, self.solr_writer]
+    `timings` keeps track of the total number of seconds spent in each
+    format's writer.
+    """
+    def __init__(self, basename=None, flat_dir='data/flat', solr_dir='data/solr',
+                 isTest=False, writers=None):
+        if writers is None:
+            flat_file_path = '%s/%s.json' % (flat_dir, basename)
+            solr_file_path = '%s/%s.json' % (solr_dir, basename)
+
+            if isTest:
+                flat_file_path = 'data/flat_test/%s.json' % basename
+                solr_file_path = 'data/solr_test/%s.json' % basename
+
+            self.flat_writer = FlatEdgeWriter(flat_file_path)
+            self.solr_writer = SolrEdgeWriter(solr_file_path)
+            writers = [self.flat_writer, self.solr_writer]
+        self.writers = writers
+        self.timings = defaultdict(float)
         self.open = True
-        self.write_header()
 
     def write_header(self):
-        for writer in self.writers:
-            writer.write_header()
+        # Each writer writes its own header when it's created.
+        pass
     
     def write_footer(self):
         # handled by .close()
@@ -129,12 +341,19 @@ class MultiWriter(object):
 
     def close(self):
         for writer in self.writers:
+            start_time = time.time()
             writer.close()
+            self.timings[writer.format] += time.time() - start_time
         self.open = False
 
     def write(self, edge):
+        timings = self.timings
+        start_time = time.time()
         for writer in self.writers:
             writer.write(edge)
+            end_time = time.time()
+            timings[writer.format] += end_time - start_time
+            start_time = end_time
 
     def __del__(self):
         if self.open:
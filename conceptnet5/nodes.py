@@ -1,8 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import re
+import os
+import sys
+import atexit
+import json
 import ftfy
 from metanl.nltk_morphy import normalize
+from conceptnet5.cache import LRUCache, PersistentCache
 
 JAPANESE_PARTS_OF_SPEECH = {
     u'名詞': u'n',
@@ -30,7 +35,89 @@ def handle_disambig(text):
     else:
         return match.group(1), 'n/' + match.group(2).strip(' _')
 
+# Readers ask for the URIs of the same common terms over and over, and
+# normalizing them is the slowest part of reading most datasets. Remember the
+# URIs of recently-seen terms.
+CONCEPT_URI_CACHE = LRUCache(
+    int(os.environ.get('CONCEPTNET_URI_CACHE_SIZE', 200000))
+)
+
+# Optionally, keep concept URIs in a SQLite file that all the reader processes
+# share, so that a rebuild doesn't have to normalize the same vocabulary again.
+# Delete the file if the way that text is normalized changes.
+NORMALIZE_CACHE_FILE = os.environ.get('CONCEPTNET_NORMALIZE_CACHE')
+if NORMALIZE_CACHE_FILE:
+    PERSISTENT_URI_CACHE = PersistentCache(NORMALIZE_CACHE_FILE, 'concept_uri')
+    atexit.register(PERSISTENT_URI_CACHE.close)
+else:
+    PERSISTENT_URI_CACHE = None
+
 def make_concept_uri(text, lang, disambiguation=None):
+    """
+    Get the URI of the concept that represents `text` in the language `lang`,
+    optionally with a disambiguation string.
+
+    Results are remembered in CONCEPT_URI_CACHE; use `concept_uri_cache_info()`
+    to see how often it helps. If the environment variable
+    CONCEPTNET_NORMALIZE_CACHE names a file, results are also saved there for
+    other processes to use.
+    """
+    key = (text, lang, disambiguation)
+    uri = CONCEPT_URI_CACHE.get(key)
+    if uri is None:
+        if PERSISTENT_URI_CACHE is not None:
+            uri = _persistent_concept_uri(key)
+        else:
+            uri = _make_concept_uri(text, lang, disambiguation)
+        CONCEPT_URI_CACHE.set(key, uri)
+    return uri
+
+def _persistent_concept_uri(key):
+    try:
+        db_key = json.dumps(key)
+    except UnicodeDecodeError:
+        # A byte string we can't decode can't be stored, but it can still
+        # be normalized.
+        return _make_concept_uri(*key)
+    uri = PERSISTENT_URI_CACHE.get(db_key)
+    if uri is None:
+        uri = _make_concept_uri(*key)
+        PERSISTENT_URI_CACHE.set(db_key, uri)
+    return uri
+
+def make_concept_uris(batch):
+    """
+    Get concept URIs for a whole list of terms at once. Each item of `batch`
+    is a tuple of (text, lang) or (text, lang, disambiguation).
+
+    Each distinct term is only normalized once, no matter how many times it
+    appears. The URIs are returned as a list in the same order as the batch.
+    """
+    uris = {}
+    results = []
+    for item in batch:
+        if item not in uris:
+            uris[item] = make_concept_uri(*item)
+        results.append(uris[item])
+    return results
+
+def concept_uri_cache_info():
+    """
+    Return the hit and miss counts of the concept URI cache, as a dictionary.
+    """
+    return CONCEPT_URI_CACHE.info()
+
+def _report_cache_info():
+    info = concept_uri_cache_info()
+    print >> sys.stderr, (
+        "concept URI cache: %(hits)d hits, %(misses)d misses "
+        "(%(hit_rate).1f%% hit rate)" % dict(info, hit_rate=info['hit_rate'] * 100)
+    )
+
+if os.environ.get('CONCEPTNET_CACHE_STATS'):
+    atexit.register(_report_cache_info)
+
+def _make_concept_uri(text, lang, disambiguation=None):
     text = ftfy.ftfy(text).strip()
     if disambiguation is None:
         text, disambiguation = handle_disambig(text)
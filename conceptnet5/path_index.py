@@ -0,0 +1,333 @@
+"""
+Sorted, memory-mapped indexes from the values of each path field, such as
+'start' or 'dataset', to the edges that have them. Finding the edges whose
+field starts with a prefix takes a few binary searches, for the values equal
+to the prefix and the values below it in the path hierarchy, so it takes
+O(log n + k) time to find k edges. As in the edge store, /c/en/dog matches
+/c/en/dog/n/pet but not /c/en/doghouse.
+
+Unlike Solr and the edge store, a path index doesn't rank edges by weight.
+They come in the order of the values they were found by, then in the order
+they were added.
+
+A path index is a directory containing:
+
+- edges.jsons: the edges, one JSON object per line
+- <field>.keys: the values of a field on all the edges, as UTF-8, sorted by
+  their bytes and concatenated together
+- <field>.idx: an entry for each of those values, made of two 64-bit
+  integers: where the value starts in the .keys file, and where its edge
+  starts in edges.jsons. A final entry marks the end of the last value.
+
+Build one from files of assertions with
+conceptnet5.builders.json_to_path_index.
+"""
+from conceptnet5.edge_store import (PATH_FIELDS, index_values, path_prefix,
+    path_bounds, path_matches)
+from conceptnet5.builders.sort_edges import external_sort, DEFAULT_RUN_SIZE
+from itertools import islice
+import tempfile
+import struct
+import mmap
+import json
+import os
+
+ENTRY = struct.Struct('<QQ')
+EDGES_FILE = 'edges.jsons'
+
+# Fields that only have one value on each edge, so a range of their index
+# never refers to the same edge twice.
+SINGLE_VALUED_FIELDS = set(['id', 'uri', 'rel', 'start', 'end', 'dataset',
+                            'license', 'context'])
+
+
+def _map_file(filename):
+    file = open(filename, 'rb')
+    if os.path.getsize(filename) == 0:
+        # Empty files can't be memory-mapped.
+        return file, ''
+    return file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def build_path_index(streams, dirname, run_size=DEFAULT_RUN_SIZE, tmpdir=None):
+    """
+    Build a path index in `dirname` from streams of JSON edges. The values of
+    each field are sorted with an external sort, so this doesn't need to hold
+    them all in memory.
+    """
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    unsorted = {}
+    for field in PATH_FIELDS:
+        fd, filename = tempfile.mkstemp(suffix='.%s' % field, dir=tmpdir)
+        unsorted[field] = (filename, os.fdopen(fd, 'wb'))
+
+    with open(os.path.join(dirname, EDGES_FILE), 'wb') as edges_out:
+        for stream in streams:
+            for line in stream:
+                line = line.strip()
+                if not line:
+                    continue
+                offset = edges_out.tell()
+                edges_out.write(line + '\n')
+                edge = json.loads(line.decode('utf-8'))
+                for field, value in index_values(edge):
+                    # Zero-padding the offsets keeps each value's edges in
+                    # order when the lines are sorted.
+                    print >> unsorted[field][1], '%s\t%012d' % (
+                        value.encode('utf-8'), offset
+                    )
+
+    for field in PATH_FIELDS:
+        filename, out = unsorted[field]
+        out.close()
+        with open(filename, 'rb') as input:
+            _write_field_index(
+                external_sort([input], run_size=run_size, tmpdir=tmpdir),
+                os.path.join(dirname, field)
+            )
+        os.remove(filename)
+
+
+def _write_field_index(sorted_lines, basename):
+    with open(basename + '.keys', 'wb') as keys_out:
+        with open(basename + '.idx', 'wb') as entries_out:
+            for line in sorted_lines:
+                value, offset = line.rstrip('\n').rsplit('\t', 1)
+                entries_out.write(ENTRY.pack(keys_out.tell(), int(offset)))
+                keys_out.write(value)
+            entries_out.write(ENTRY.pack(keys_out.tell(), 0))
+
+
+class FieldIndex(object):
+    """
+    The memory-mapped index of one field's values.
+    """
+    def __init__(self, basename):
+        self.keys_file, self.keys = _map_file(basename + '.keys')
+        self.entries_file, self.entries = _map_file(basename + '.idx')
+        self.size = len(self.entries) // ENTRY.size - 1
+
+    def key(self, i):
+        start = ENTRY.unpack_from(self.entries, i * ENTRY.size)[0]
+        end = ENTRY.unpack_from(self.entries, (i + 1) * ENTRY.size)[0]
+        return self.keys[start:end]
+
+    def edge_offset(self, i):
+        return ENTRY.unpack_from(self.entries, i * ENTRY.size)[1]
+
+    def bisect(self, key):
+        """
+        Find the number of the first entry whose value is not less than
+        `key`, a byte string.
+        """
+        lo, hi = 0, self.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_ranges(self, prefix):
+        """
+        Get the ranges of entries whose values are `prefix`, which should
+        come from `path_prefix`, or are below it in the path hierarchy.
+        Values such as prefix + '-x' can sort between them, so these are two
+        separate (start, end) ranges. Empty ranges are left out.
+        """
+        lower, upper = path_bounds(prefix)
+        prefix, lower, upper = [value.encode('utf-8')
+                                for value in (prefix, lower, upper)]
+        ranges = [
+            # No byte of UTF-8 is \x00 except the character \x00, so only
+            # the prefix itself sorts before this.
+            (self.bisect(prefix), self.bisect(prefix + '\x00')),
+            (self.bisect(lower), self.bisect(upper))
+        ]
+        return [(start, end) for start, end in ranges if start < end]
+
+    def close(self):
+        if self.keys:
+            self.keys.close()
+        if self.entries:
+            self.entries.close()
+        self.keys_file.close()
+        self.entries_file.close()
+
+
+class PathIndex(object):
+    """
+    Finds edges by prefixes of their path fields, using the indexes in
+    `dirname`. It answers queries the same way as an EdgeStore, except that
+    the edges come in the order of the values they were found by, not by
+    weight.
+    """
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.edges_file, self.edges = _map_file(os.path.join(dirname, EDGES_FILE))
+        self.fields = {}
+        for field in PATH_FIELDS:
+            basename = os.path.join(dirname, field)
+            if os.path.exists(basename + '.idx'):
+                self.fields[field] = FieldIndex(basename)
+
+    def edge_at(self, offset):
+        end = self.edges.find('\n', offset)
+        return json.loads(self.edges[offset:end].decode('utf-8'))
+
+    def query(self, prefixes, min_weight=None, offset=0, limit=50):
+        """
+        Find the edges whose fields start with the given prefixes, a
+        dictionary from field names to prefixes or a list of (field, prefix)
+        pairs. Returns the total number of such edges, and a list of the edges
+        from `offset` to `offset + limit`.
+        """
+        plan = self._plan(prefixes)
+        if plan is None:
+            return 0, []
+        field, prefix, ranges, others = plan
+        index = self.fields[field]
+        if (not others and min_weight is None and
+                field in SINGLE_VALUED_FIELDS):
+            # The ranges are the answer, so only read the edges on this page.
+            size = sum(end - start for start, end in ranges)
+            offset = max(0, offset)
+            positions = islice(positions_in(ranges), offset, offset + limit)
+            edges = [self.edge_at(index.edge_offset(i)) for i in positions]
+            return size, edges
+
+        seen = set()
+        count = 0
+        edges = []
+        for i in positions_in(ranges):
+            edge_offset = index.edge_offset(i)
+            if edge_offset in seen:
+                continue
+            seen.add(edge_offset)
+            edge = None
+            if others or min_weight is not None:
+                edge = self.edge_at(edge_offset)
+                if not matches(edge, others, min_weight):
+                    continue
+            if offset <= count < offset + limit:
+                if edge is None:
+                    edge = self.edge_at(edge_offset)
+                edges.append(edge)
+            count += 1
+        return count, edges
+
+    def _plan(self, prefixes):
+        """
+        Decide how to answer a query: scan the entries that match the prefix
+        with the fewest of them, and check the other conditions on each edge
+        they refer to. Returns that prefix's field, the prefix, the ranges of
+        its entries, and the other (field, prefix) pairs, or None if there
+        are no prefixes.
+        """
+        if isinstance(prefixes, dict):
+            prefixes = sorted(prefixes.items())
+        choices = []
+        for field, prefix in prefixes:
+            if field not in self.fields:
+                raise ValueError('Unknown field: %s' % field)
+            if not isinstance(prefix, unicode):
+                prefix = prefix.decode('utf-8')
+            prefix = path_prefix(prefix)
+            ranges = self.fields[field].prefix_ranges(prefix)
+            size = sum(end - start for start, end in ranges)
+            choices.append((size, field, prefix, ranges))
+        if not choices:
+            return None
+        choices.sort()
+        size, field, prefix, ranges = choices[0]
+        others = [(other_field, other_prefix)
+                  for _, other_field, other_prefix, _ in choices[1:]]
+        return field, prefix, ranges, others
+
+    def query_page(self, prefixes, min_weight=None, cursor=None, limit=50):
+        """
+        Get a page of up to `limit` edges for a query, starting from `cursor`,
+        which is None for the first page. Returns the total number of edges,
+        the page of edges, and the cursor for the next page, which is None
+        after the last page.
+
+        Each page takes time in proportion to its own length, not to how far
+        into the results it is. Counting the edges can take longer, so unless
+        the count comes directly from the index, it's only done for the first
+        page, and is None on later pages.
+        """
+        plan = self._plan(prefixes)
+        if plan is None:
+            return 0, [], None
+        field, prefix, ranges, others = plan
+        index = self.fields[field]
+        multi_valued = field not in SINGLE_VALUED_FIELDS
+        fast = not (others or min_weight is not None or multi_valued)
+        if fast:
+            count = sum(end - start for start, end in ranges)
+        elif cursor is None:
+            count = self.query(prefixes, min_weight, 0, 0)[0]
+        else:
+            count = None
+
+        # The cursor is the next entry to look at.
+        if cursor is None:
+            cursor = 0
+        edges = []
+        for position in positions_in(ranges, int(cursor)):
+            if len(edges) >= limit:
+                return count, edges, position
+            edge = self.edge_at(index.edge_offset(position))
+            if fast:
+                edges.append(edge)
+            elif matches(edge, others, min_weight) and (
+                not multi_valued or
+                first_match(edge, field, prefix) == index.key(position)
+            ):
+                # An edge with more than one matching value is returned at
+                # the first of them.
+                edges.append(edge)
+        return count, edges, None
+
+    def close(self):
+        for index in self.fields.values():
+            index.close()
+        if self.edges:
+            self.edges.close()
+        self.edges_file.close()
+
+
+def positions_in(ranges, cursor=0):
+    """
+    Iterate over the entry numbers in a sorted list of (start, end) ranges,
+    starting from `cursor`.
+    """
+    for start, end in ranges:
+        for position in xrange(max(start, cursor), end):
+            yield position
+
+
+def matches(edge, prefixes, min_weight=None):
+    """
+    Check whether an edge has values matching all of the given
+    (field, prefix) pairs, and at least the given weight.
+    """
+    if min_weight is not None and edge['weight'] < min_weight:
+        return False
+    values = index_values(edge)
+    for field, prefix in prefixes:
+        if not any(value_field == field and path_matches(value, prefix)
+                   for value_field, value in values):
+            return False
+    return True
+
+
+def first_match(edge, field, prefix):
+    """
+    Get the first value of `field` on an edge that matches `prefix`, in the
+    order of the index, as UTF-8.
+    """
+    return min(value.encode('utf-8') for value_field, value in index_values(edge)
+               if value_field == field and path_matches(value, prefix))
@@ -0,0 +1,234 @@
+"""
+Token-bucket rate limiters for the API.
+
+Each client has a bucket that holds up to `burst` tokens and refills at
+`rate` tokens per second. A request takes a token from its client's bucket,
+and is rejected if the bucket is empty. Checking a request takes constant
+time, and the number of buckets is bounded, however many clients there are.
+
+TokenBucketLimiter keeps its buckets in the memory of one process.
+SharedTokenBucketLimiter keeps them in shared memory, so that all the
+processes forked from the one that created it enforce one limit together.
+"""
+from collections import OrderedDict
+import errno
+import hashlib
+import multiprocessing
+import os
+import time
+
+
+def refill(tokens, last_time, now, rate, burst):
+    """
+    Get the number of tokens in a bucket that had `tokens` at `last_time`.
+    """
+    return min(burst, tokens + (now - last_time) * rate)
+
+
+class TokenBucketLimiter(object):
+    """
+    Rate-limits clients by key, such as their IP address, keeping buckets for
+    up to `maxsize` of the most recently seen clients. A client whose bucket
+    was discarded gets a full bucket when it returns, which is what it would
+    have refilled to anyway unless it was discarded quickly.
+    """
+    def __init__(self, rate, burst, maxsize=100000, clock=time.time):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.maxsize = maxsize
+        self.clock = clock
+        self.buckets = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def allow(self, key, cost=1):
+        """
+        Take `cost` tokens from the bucket for `key`, and return True, if it
+        has that many. Otherwise, return False.
+        """
+        now = self.clock()
+        bucket = self.buckets.pop(key, None)
+        if bucket is None:
+            tokens = self.burst
+            if len(self.buckets) >= self.maxsize:
+                self.buckets.popitem(last=False)
+        else:
+            tokens = refill(bucket[0], bucket[1], now, self.rate, self.burst)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+            self.allowed += 1
+        else:
+            self.rejected += 1
+        self.buckets[key] = (tokens, now)
+        return allowed
+
+    def retry_after(self, key, cost=1):
+        """
+        The number of seconds until the bucket for `key` has `cost` tokens,
+        if it isn't used in the meantime.
+        """
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            return 0.
+        tokens = refill(bucket[0], bucket[1], self.clock(), self.rate,
+                        self.burst)
+        return max(0., (cost - tokens) / self.rate)
+
+    def info(self):
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'allowed': self.allowed,
+            'rejected': self.rejected,
+            'clients': len(self.buckets),
+            'maxsize': self.maxsize
+        }
+
+
+class SharedTokenBucketLimiter(TokenBucketLimiter):
+    """
+    A TokenBucketLimiter whose buckets are in memory shared by every process
+    forked after it's created, such as the workers of `gunicorn --preload`.
+
+    There is a fixed number of `slots`, in groups of WAYS, and each key is
+    hashed to a group. A key that isn't in its group takes over the slot
+    whose bucket is fullest, along with the tokens in that bucket, so that
+    clients can't get more tokens by pushing each other out. The bucket is
+    only full if its slot was empty or its client has been idle.
+
+    Each group of slots is protected by one of LOCKS locks. If a process dies
+    while it holds a lock, the next process to wait LOCK_TIMEOUT seconds for
+    it releases it. Requests that still can't get their lock are allowed,
+    instead of waiting.
+    """
+    # Each slot holds the key's hash, its number of tokens, and the time
+    # they were counted.
+    SLOT_SIZE = 3
+    WAYS = 4
+    LOCKS = 64
+    LOCK_TIMEOUT = 0.1
+
+    def __init__(self, rate, burst, slots=65536, clock=time.time):
+        TokenBucketLimiter.__init__(self, rate, burst, slots, clock)
+        self.buckets = None
+        self.groups = max(1, slots // self.WAYS)
+        self.maxsize = self.groups * self.WAYS
+        self.slots = multiprocessing.RawArray('d', self.maxsize * self.SLOT_SIZE)
+        # The allowed and rejected counts of all processes.
+        self.counts = multiprocessing.RawArray('d', 2)
+        self.locks = [multiprocessing.Lock()
+                      for i in xrange(min(self.LOCKS, self.groups))]
+        # The process ID that holds each lock, or 0.
+        self.holders = multiprocessing.RawArray('i', len(self.locks))
+
+    def _group(self, key):
+        """
+        Get the hash of a key, and the number of the group of slots it goes
+        in.
+        """
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        # 52 bits of hash fit exactly in a double, and the + 1 keeps it from
+        # matching an empty slot.
+        key_hash = int(hashlib.md5(key).hexdigest()[:13], 16) + 1
+        return float(key_hash), key_hash % self.groups
+
+    def _acquire(self, group):
+        """
+        Lock a group of slots, and return True, or return False if its lock
+        is held by a process that isn't letting go of it.
+        """
+        index = group % len(self.locks)
+        lock = self.locks[index]
+        if not lock.acquire(True, self.LOCK_TIMEOUT):
+            holder = self.holders[index]
+            if not holder or process_exists(holder):
+                return False
+            # The process that held the lock died without releasing it.
+            try:
+                lock.release()
+            except ValueError:
+                # Another process released it first.
+                pass
+            if not lock.acquire(True, self.LOCK_TIMEOUT):
+                return False
+        self.holders[index] = os.getpid()
+        return True
+
+    def _release(self, group):
+        index = group % len(self.locks)
+        self.holders[index] = 0
+        self.locks[index].release()
+
+    def _find_slot(self, key_hash, group, now):
+        """
+        Get the offset of a key's slot in its group, and the number of tokens
+        in its bucket. If the key has no slot, this is the slot it would take
+        over.
+        """
+        slots = self.slots
+        start = group * self.WAYS * self.SLOT_SIZE
+        end = start + self.WAYS * self.SLOT_SIZE
+        best_offset, best_tokens = None, None
+        for offset in xrange(start, end, self.SLOT_SIZE):
+            if slots[offset] == 0.:
+                tokens = self.burst
+            else:
+                tokens = refill(slots[offset + 1], slots[offset + 2], now,
+                                self.rate, self.burst)
+                if slots[offset] == key_hash:
+                    return offset, tokens
+            if best_tokens is None or tokens > best_tokens:
+                best_offset, best_tokens = offset, tokens
+        return best_offset, best_tokens
+
+    def allow(self, key, cost=1):
+        key_hash, group = self._group(key)
+        if not self._acquire(group):
+            return True
+        try:
+            now = self.clock()
+            offset, tokens = self._find_slot(key_hash, group, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+                self.counts[0] += 1
+            else:
+                self.counts[1] += 1
+            slots = self.slots
+            slots[offset] = key_hash
+            slots[offset + 1] = tokens
+            slots[offset + 2] = now
+        finally:
+            self._release(group)
+        return allowed
+
+    def retry_after(self, key, cost=1):
+        key_hash, group = self._group(key)
+        if not self._acquire(group):
+            return 0.
+        try:
+            offset, tokens = self._find_slot(key_hash, group, self.clock())
+        finally:
+            self._release(group)
+        return max(0., (cost - tokens) / self.rate)
+
+    def info(self):
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'allowed': int(self.counts[0]),
+            'rejected': int(self.counts[1]),
+            'slots': self.maxsize,
+            'shared': True
+        }
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError, error:
+        # The process exists if we just aren't allowed to signal it.
+        return error.errno == errno.EPERM
+    return True
@@ -1,13 +1,143 @@
 import sys
+import argparse
+import multiprocessing
+from collections import deque
+from conceptnet5 import nodes
 
+DEFAULT_CHUNK_SIZE = 1000
 
-def transform_stream(func, stream_in=None, stream_out=None):
+
+def transform_stream(func, stream_in=None, stream_out=None, workers=1,
+                     ordered=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                     postprocess=None):
+    """
+    Run `func` on each line of `stream_in`, decoded as UTF-8 and stripped,
+    and write each result that it yields to `stream_out` as a line of UTF-8.
+
+    With `workers` greater than 1, the lines are sent in chunks of
+    `chunk_size` to a pool of that many processes. The results are written in
+    the same order as the input, unless `ordered` is False, in which case
+    each chunk's results are written as soon as they are ready.
+
+    `postprocess`, if given, is called in this process on each result of
+    `func`, in the order they are written. It returns the line to write, or
+    None to skip the result. This is the place to keep state that has to see
+    every result, such as a set of duplicates to remove, because the worker
+    processes don't share anything.
+    """
     if stream_in is None:
         stream_in = sys.stdin
     if stream_out is None:
         stream_out = sys.stdout
-    for line in sys.stdin:
-        line = line.strip().decode('utf-8')
-        for result in func(line):
-            print >> stream_out, result.encode('utf-8')
+    if workers > 1:
+        results = _parallel_results(func, stream_in, workers, ordered,
+                                    chunk_size)
+    else:
+        results = (result for line in stream_in
+                   for result in func(_decode_line(line)))
+    for result in results:
+        if postprocess is not None:
+            result = postprocess(result)
+            if result is None:
+                continue
+        print >> stream_out, result.encode('utf-8')
+
+
+def run_transform_stream(func, postprocess=None):
+    """
+    Run `transform_stream` from stdin to stdout, as the main function of a
+    reader, taking options for parallelism from the command line.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-w', '--workers', type=int, default=1,
+        help='the number of processes to read lines with'
+    )
+    parser.add_argument('--unordered', action='store_true',
+        help="with multiple workers, don't keep the output in input order"
+    )
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+        help='the number of lines to send to a worker at a time'
+    )
+    args = parser.parse_args()
+    transform_stream(func, workers=args.workers, ordered=not args.unordered,
+                     chunk_size=args.chunk_size, postprocess=postprocess)
+
+
+def _decode_line(line):
+    return line.strip().decode('utf-8')
+
+
+def _chunks(stream, chunk_size):
+    chunk = []
+    for line in stream:
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# The function that each worker process applies to its chunks. It's set when
+# the worker starts, so that it doesn't have to be pickled along with every
+# chunk.
+_worker_func = None
+
+def _init_worker(func):
+    global _worker_func
+    _worker_func = func
+    if nodes.PERSISTENT_URI_CACHE is not None:
+        nodes.PERSISTENT_URI_CACHE.reopen()
+
+
+def _run_chunk(lines):
+    results = []
+    for line in lines:
+        results.extend(_worker_func(_decode_line(line)))
+    # Pool workers don't run exit handlers, so save their new URIs now.
+    if nodes.PERSISTENT_URI_CACHE is not None:
+        nodes.PERSISTENT_URI_CACHE.flush()
+    return results
+
+
+def _parallel_results(func, stream_in, workers, ordered, chunk_size):
+    """
+    Apply `func` to the lines of `stream_in` in a pool of processes, yielding
+    its results.
+
+    Only a few chunks per worker are in flight at once, so the input is read
+    no faster than it can be processed.
+    """
+    if nodes.PERSISTENT_URI_CACHE is not None:
+        nodes.PERSISTENT_URI_CACHE.flush()
+    pool = multiprocessing.Pool(workers, _init_worker, (func,))
+    pending = deque()
+    try:
+        for chunk in _chunks(stream_in, chunk_size):
+            pending.append(pool.apply_async(_run_chunk, (chunk,)))
+            while len(pending) >= workers * 2:
+                for result in _next_finished(pending, ordered):
+                    yield result
+        while pending:
+            for result in _next_finished(pending, ordered):
+                yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
 
+def _next_finished(pending, ordered):
+    """
+    Remove a finished chunk from the `pending` queue and return its results,
+    waiting for one to finish if necessary. When `ordered` is True, this is
+    always the oldest chunk.
+    """
+    if not ordered:
+        for async_result in pending:
+            if async_result.ready():
+                pending.remove(async_result)
+                return async_result.get()
+    return pending.popleft().get()
@@ -10,7 +10,7 @@ import re
 import argparse
 import json
 
-from conceptnet5.edges import MultiWriter, make_edge
+from conceptnet5.edges import MultiWriter, make_edge, encode_edge
 from conceptnet5.nodes import normalize_uri, make_concept_uri
 
 
@@ -135,64 +135,86 @@ def by_bedume_and_bad(source_list,start,end):
                 return True
     return False
 
+def build_edges(flat_assertion):
+    """
+    Build the edges for a line of raw ConceptNet 4 data. For each edge, yield
+    a tuple of its JSON representation and a key for detecting duplicates,
+    which is (assertion URI, contributor) or None.
+
+    This function doesn't keep any state, so it can run in many processes at
+    once; CN4Builder.check_seen does the duplicate detection afterward.
+    """
+    parts_dict = json.loads(flat_assertion)
+
+    if can_skip(parts_dict):
+        return
+
+    # fix the result of some process that broke prepositions ages ago
+    preposition_fix = False
+    if '} around {' in parts_dict['frame_text']:
+        for prep in AROUND_PREPOSITIONS:
+            if parts_dict['endText'].startswith(prep + ' '):
+                parts_dict['endText'] = \
+                    parts_dict['endText'][len(prep) + 1:]
+                replacement = '} %s {' % prep
+                parts_dict['frame_text'] = \
+                    parts_dict['frame_text'].replace(
+                        '} around {',
+                        replacement
+                    )
+                preposition_fix = True
+                break
+
+    # build the assertion
+    frame_text = build_frame_text(parts_dict)
+    relation = build_relation(parts_dict)
+    start = build_start(parts_dict)
+    end = build_end(parts_dict)
+    dataset = build_data_set(parts_dict)
+    sources = build_sources(parts_dict, preposition_fix)
+
+    reject = False
+    for source_list, weight in sources:
+        if 'commons2_reject' in ' '.join(source_list):
+            reject = True
+
+    if not reject:
+        for source_list, weight in sources:
+            if not by_bedume_and_bad(source_list,start,end):
+                contributors = [s for s in source_list if s.startswith('/s/contributor')]
+                assert len(contributors) <= 1, contributors
+                edge = make_edge(relation, start, end, dataset, LICENSE, source_list, '/ctx/all', frame_text, weight=weight)
+                seen_key = None
+                if contributors:
+                    seen_key = (edge['uri'], contributors[0])
+                yield encode_edge(edge, ensure_ascii=False), seen_key
+
+
 class CN4Builder(object):
     def __init__(self):
         self.seen_sources = set()
 
+    def check_seen(self, result):
+        """
+        Take in a result of `build_edges`, and return its JSON line if we
+        haven't already seen an edge for the same assertion from the same
+        contributor, or None if we have.
+        """
+        line, seen_key = result
+        if seen_key is not None:
+            if seen_key in self.seen_sources:
+                return None
+            self.seen_sources.add(seen_key)
+        return line
+
     def handle_raw_assertion(self, flat_assertion):
-        parts_dict = json.loads(flat_assertion)
-        
-        if can_skip(parts_dict):
-            return
-
-        # fix the result of some process that broke prepositions ages ago
-        preposition_fix = False
-        if '} around {' in parts_dict['frame_text']:
-            for prep in AROUND_PREPOSITIONS:
-                if parts_dict['endText'].startswith(prep + ' '):
-                    parts_dict['endText'] = \
-                        parts_dict['endText'][len(prep) + 1:]
-                    replacement = '} %s {' % prep
-                    parts_dict['frame_text'] = \
-                        parts_dict['frame_text'].replace(
-                            '} around {',
-                            replacement
-                        )
-                    preposition_fix = True
-                    break
-            
-        # build the assertion
-        frame_text = build_frame_text(parts_dict)
-        relation = build_relation(parts_dict)
-        start = build_start(parts_dict)
-        end = build_end(parts_dict)
-        dataset = build_data_set(parts_dict)
-        sources = build_sources(parts_dict, preposition_fix)
-
-        reject = False
-        for source_list, weight in sources:
-            if 'commons2_reject' in ' '.join(source_list):
-                reject = True
-
-        if not reject:
-            for source_list, weight in sources:
-                if not by_bedume_and_bad(source_list,start,end):
-                    contributors = [s for s in source_list if s.startswith('/s/contributor')]
-                    assert len(contributors) <= 1, contributors
-                    edge = make_edge(relation, start, end, dataset, LICENSE, source_list, '/ctx/all', frame_text, weight=weight)
-                    okay = True
-                    if contributors:
-                        uri = edge['uri']
-                        contributor = contributors[0]
-                        if (uri, contributor) in self.seen_sources:
-                            okay = False
-                        else:
-                            self.seen_sources.add((uri, contributor))
-                    if okay:
-                        yield json.dumps(edge, ensure_ascii=False)
+        for result in build_edges(flat_assertion):
+            line = self.check_seen(result)
+            if line is not None:
+                yield line
 
 
 if __name__ == '__main__':
-    from conceptnet5.readers import transform_stream
+    from conceptnet5.readers import run_transform_stream
     builder = CN4Builder()
-    transform_stream(builder.handle_raw_assertion)
+    run_transform_stream(build_edges, postprocess=builder.check_seen)
@@ -6,7 +6,7 @@ __author__ = 'Justin Venezuela (jven@mit.edu), Rob Speer (rspeer@mit.edu)'
 
 from metanl.token_utils import un_camel_case
 from conceptnet5.nodes import make_concept_uri, normalize_uri
-from conceptnet5.edges import make_edge
+from conceptnet5.edges import make_edge, encode_edge
 import urllib
 import json
 import sys
@@ -75,7 +75,7 @@ def handle_triple(line, out, map_out):
                      sources=['/s/dbpedia/3.7'],
                      context='/ctx/all',
                      weight=0.5)
-    write_json(out, edge)
+    print >> out, encode_edge(edge, ensure_ascii=False)
 
 if __name__ == '__main__':
     handle_file(sys.argv[1], sys.argv[2], sys.argv[3])
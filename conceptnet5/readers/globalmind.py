@@ -1,5 +1,5 @@
 from conceptnet5.nodes import make_concept_uri
-from conceptnet5.edges import MultiWriter, make_edge
+from conceptnet5.edges import MultiWriter, make_edge, encode_edge
 
 import yaml
 import sys
@@ -103,7 +103,7 @@ def build_from_dir(dirname):
                          sources=sources,
                          surfaceText=surfaceText,
                          weight=1)
-        yield json.dumps(edge, ensure_ascii=False)
+        yield encode_edge(edge, ensure_ascii=False)
         assertions[assertion['pk']] = edge
 
     translationdata = yaml.load_all(open(dirname + '/GMTranslation.yaml'))
@@ -134,7 +134,7 @@ def build_from_dir(dirname):
                          sources=sources,
                          surfaceText=surfaceText,
                          weight=1)
-        yield json.dumps(edge, ensure_ascii=False)
+        yield encode_edge(edge, ensure_ascii=False)
 
 
 def run_stream(dirname, stream_out=None):
@@ -5,7 +5,7 @@ import json
 import codecs
 import pycountry
 from conceptnet5.nodes import make_concept_uri
-from conceptnet5.edges import make_edge
+from conceptnet5.edges import make_edge, encode_edge
 
 # I took the time to record these, but in the end I don't think I plan
 # to use them. Japanese parts of speech don't fit neatly into
@@ -123,7 +123,7 @@ def output_edge(outfile, subj_concept, obj_concept):
                      sources=['/s/jmdict/1.07'],
                      context='/ctx/all',
                      weight=0.5)
-    print >> outfile, json.dumps(edge, ensure_ascii=False)
+    print >> outfile, encode_edge(edge, ensure_ascii=False)
 
 if __name__ == '__main__':
     read_jmdict(sys.argv[1], sys.argv[2])
@@ -4,7 +4,7 @@ import sys
 import json
 from collections import defaultdict
 from conceptnet5.nodes import make_concept_uri
-from conceptnet5.edges import make_edge
+from conceptnet5.edges import make_edge, encode_edge
 from conceptnet5.whereami import get_project_filename
 
 FRAME_DATA = json.load(
@@ -28,9 +28,9 @@ def handle_raw_assertion(line):
     edge = make_edge(rel, start, end, dataset='/d/conceptnet/4/zh',
                      license='/l/CC/By', sources=sources,
                      surfaceText=surfaceText, weight=1)
-    yield json.dumps(edge, ensure_ascii=False)
+    yield encode_edge(edge, ensure_ascii=False)
 
 if __name__ == '__main__':
-    from conceptnet5.readers import transform_stream
-    transform_stream(handle_raw_assertion)
+    from conceptnet5.readers import run_transform_stream
+    run_transform_stream(handle_raw_assertion)
 
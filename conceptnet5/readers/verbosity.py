@@ -114,6 +114,7 @@ def run_verbosity(infile, outfile):
                              '/l/CC/By', sources, surfaceText=text,
                              weight=weight)
             writer.write(edge)
+    writer.close()
 
 if __name__ == '__main__':
     run_verbosity(sys.argv[1], sys.argv[2])
@@ -335,4 +335,5 @@ if __name__ == '__main__':
 
     # Parse the input
     parser.parse(open(sys.argv[1]))
+    dh.writer.close()
 
@@ -366,4 +366,5 @@ if __name__ == '__main__':
 
     # Parse the input
     parser.parse(open(sys.argv[1]))
+    dh.writer.close()
 
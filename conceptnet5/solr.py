@@ -0,0 +1,254 @@
+"""
+A small HTTP client for querying Solr, which keeps connections open between
+requests instead of setting up a new TCP connection every time.
+"""
+
+import httplib
+import json
+import socket
+import time
+import urllib
+import urlparse
+import Queue
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+
+
+class SolrError(Exception):
+    """
+    Raised when Solr can't be reached, or returns an error, even after
+    retrying. `status` is the HTTP status that Solr returned, if it returned
+    one.
+    """
+    def __init__(self, message, status=None):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class SolrClient(object):
+    """
+    Sends queries to the Solr request handler at `base_url`, such as
+    'http://localhost:8983/solr/select', and returns the decoded JSON
+    responses.
+
+    Up to `pool_size` idle connections are kept alive for reuse. Each request
+    times out after `timeout` seconds. Requests that fail because of a
+    network problem or a server error are retried up to `retries` more times,
+    waiting `backoff` seconds before the first retry and twice as long before
+    each one after that.
+    """
+    def __init__(self, base_url, pool_size=4, timeout=10., retries=2,
+                 backoff=0.05):
+        parts = urlparse.urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path or '/'
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle = Queue.LifoQueue(pool_size)
+
+    def url(self, params):
+        return 'http://%s:%d%s?%s' % (self.host, self.port, self.path,
+                                      urllib.urlencode(params))
+
+    def query(self, params, timeout=None):
+        """
+        Send a query with the given parameters, and return the response as a
+        dictionary.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        path = self.path + '?' + urllib.urlencode(params)
+        delay = self.backoff
+        for attempt in xrange(self.retries + 1):
+            if attempt > 0:
+                time.sleep(delay)
+                delay *= 2
+            try:
+                return json.loads(self._request(path, timeout))
+            except (socket.error, httplib.HTTPException), error:
+                # The idle connections may have failed the same way.
+                self.close()
+                failure = error
+            except SolrError, error:
+                # Errors in the query itself won't go away by retrying.
+                if error.status < 500:
+                    raise
+                failure = error
+        raise SolrError('Solr request failed: %s' % failure,
+                        getattr(failure, 'status', None))
+
+    def _request(self, path, timeout):
+        conn, reused = self._get_connection(timeout)
+        try:
+            try:
+                response = self._send(conn, path)
+            except socket.timeout:
+                raise
+            except (socket.error, httplib.BadStatusLine):
+                if not reused:
+                    raise
+                # Solr closed this connection while it was idle, so it
+                # probably closed the other idle ones too. Drop them all, and
+                # send the request again on a new connection, without counting
+                # it as a retry.
+                conn.close()
+                self.close()
+                conn = self._connect(timeout)
+                response = self._send(conn, path)
+            data = response.read()
+        except:
+            conn.close()
+            raise
+        if response.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        if response.status != 200:
+            raise SolrError('Solr returned HTTP %d' % response.status,
+                            response.status)
+        return data
+
+    def _send(self, conn, path):
+        conn.request('GET', path, headers={'Connection': 'keep-alive'})
+        return conn.getresponse()
+
+    def _connect(self, timeout):
+        return httplib.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _get_connection(self, timeout):
+        """
+        Get an idle connection if there is one, or a new one otherwise.
+        Returns the connection, and whether it has been used before.
+        """
+        try:
+            conn = self.idle.get_nowait()
+        except Queue.Empty:
+            return self._connect(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _release(self, conn):
+        try:
+            self.idle.put_nowait(conn)
+        except Queue.Full:
+            conn.close()
+
+    def close(self):
+        """
+        Close all the idle connections.
+        """
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except Queue.Empty:
+                break
+
+
+class ShardedSolrClient(object):
+    """
+    Queries several Solr shards at once, instead of asking one Solr server to
+    coordinate them, and merges their results by score.
+
+    Each shard gets `timeout` seconds to respond. If some shards fail or run
+    out of time, the results from the others are returned with 'partial' set
+    to True, so that one slow shard doesn't hold up every request. A
+    SolrError is raised only if no shard responds, or if a shard rejects the
+    query itself.
+
+    Shards aren't retried by default, because of the time limit, but a query
+    sent on a connection that a shard closed while it was idle is still sent
+    again on a new one.
+    """
+    def __init__(self, shard_urls, timeout=2., pool_size=4, retries=0,
+                 backoff=0.05):
+        self.shards = [
+            SolrClient(url, pool_size=pool_size, timeout=timeout,
+                       retries=retries, backoff=backoff)
+            for url in shard_urls
+        ]
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # The threads are started on the first query, so that this can be
+        # created before a server forks its workers.
+        self.pool = None
+
+    def query(self, params, timeout=None):
+        """
+        Send a query to every shard, and return a response in the form that
+        Solr would return it, with 'numFound', 'maxScore' and the 'docs' from
+        'start' to 'start' + 'rows' across all shards. The query should ask
+        for the 'score' field, so the documents can be merged.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if self.pool is None:
+            self.pool = ThreadPool(len(self.shards) * self.pool_size)
+        start = int(params.get('start', 0))
+        rows = int(params.get('rows', 10))
+
+        # Each shard has to return enough documents to fill the requested
+        # page by itself, in case the others have nothing on it.
+        shard_params = dict(params)
+        shard_params.pop('shards', None)
+        shard_params['start'] = 0
+        shard_params['rows'] = start + rows
+
+        results = [self.pool.apply_async(shard.query, (shard_params, timeout))
+                   for shard in self.shards]
+        deadline = time.time() + timeout
+        responses = []
+        failures = []
+        for result in results:
+            try:
+                responses.append(result.get(max(0., deadline - time.time())))
+            except TimeoutError:
+                failures.append('timed out')
+            except SolrError, error:
+                if error.status is not None and error.status < 500:
+                    raise
+                failures.append(str(error))
+        if not responses:
+            raise SolrError('No shard responded: %s' % '; '.join(failures))
+        return merge_shard_responses(responses, start, rows,
+                                     partial=bool(failures))
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
+
+
+def merge_shard_responses(responses, start, rows, partial=False):
+    """
+    Combine the responses from several shards into one, sorting their
+    documents by score.
+    """
+    docs = []
+    num_found = 0
+    max_score = None
+    for response in responses:
+        result = response['response']
+        docs.extend(result['docs'])
+        num_found += result['numFound']
+        if result.get('maxScore') is not None:
+            max_score = max(max_score, result['maxScore'])
+    docs.sort(key=lambda doc: doc.get('score', 0.), reverse=True)
+    merged = {
+        'numFound': num_found,
+        'start': start,
+        'docs': docs[start:start + rows]
+    }
+    if max_score is not None:
+        merged['maxScore'] = max_score
+    return {
+        'responseHeader': responses[0].get('responseHeader', {}),
+        'response': merged,
+        'partial': partial
+    }
@@ -1,4 +1,11 @@
 #!/bin/bash
 export CONCEPTNET_ASSOC_DATA=/srv/conceptnet5/assocspace
 source /srv/conceptnet5/env/bin/activate
-gunicorn -b 0.0.0.0:8087 -w 1 conceptnet5.api:app
+# Load the assoc data once in the master process, and share it with the
+# workers, along with the rate limits.
+export CONCEPTNET_PRELOAD_ASSOC=1
+export CONCEPTNET_SHARED_RATE_LIMIT=1
+# Requests come through the reverse proxy, so rate-limit them by the address
+# it forwards.
+export CONCEPTNET_BEHIND_PROXY=1
+gunicorn -b 0.0.0.0:8087 -w ${WORKERS:-4} --preload conceptnet5.api:app
@@ -0,0 +1,13 @@
+"""
+Sample edges for the tests of the edge store and the path index.
+"""
+
+def sample_edge(start, end, weight, dataset='/d/conceptnet/5/combined-core'):
+    return {
+        'id': '/e/%s-%s' % (start, end),
+        'uri': '/a/[/r/IsA/,%s/,%s/]' % (start, end),
+        'rel': '/r/IsA', 'start': start, 'end': end,
+        'context': '/ctx/all', 'dataset': dataset, 'license': '/l/CC/By',
+        'sources': '/or/[/and/[/s/contributor/omcs/rspeer/,/s/activity/omcs/vote/]/]',
+        'features': [], 'weight': weight, 'surfaceText': None
+    }
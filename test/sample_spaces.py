@@ -0,0 +1,43 @@
+"""
+Small AssocSpaces for the tests of the assoc indexes and the assoc API.
+"""
+import numpy as np
+
+class FakeSpace(object):
+    """
+    Just enough of an AssocSpace to build indexes from.
+    """
+    def __init__(self, labels, assoc):
+        self.labels = labels
+        self.assoc = assoc
+
+    def vector_from_terms(self, terms):
+        vec = np.zeros(self.assoc.shape[1])
+        for term, weight in terms:
+            if term in self.labels:
+                vec += self.assoc[self.labels.index(term)] * weight
+        return vec
+
+class LazySpace(FakeSpace):
+    """
+    A space that computes `assoc` from `u` the first time it's used, as a
+    read-only property, the way some versions of AssocSpace do.
+    """
+    def __init__(self, labels, u):
+        self.labels = labels
+        self.u = u
+        self._assoc = None
+
+    @property
+    def assoc(self):
+        if self._assoc is None:
+            self._assoc = self.u / np.sqrt((self.u ** 2).sum(axis=1))[:, np.newaxis]
+        return self._assoc
+
+def make_space(nterms=200, k=10):
+    rng = np.random.RandomState(0)
+    assoc = rng.normal(size=(nterms, k))
+    assoc /= np.sqrt((assoc ** 2).sum(axis=1))[:, np.newaxis]
+    langs = ['en', 'fr', 'ja']
+    labels = ['/c/%s/term%d' % (langs[i % 3], i) for i in range(nterms)]
+    return FakeSpace(labels, assoc)
@@ -0,0 +1,277 @@
+import os
+import tempfile
+# Log somewhere that exists, instead of the server's log directory
+os.environ.setdefault('CONCEPTNET_LOG_FILE',
+                      os.path.join(tempfile.gettempdir(), 'conceptnet5_test.log'))
+
+from conceptnet5 import api
+from conceptnet5.solr import SolrError
+from conceptnet5.cache import TTLCache
+from conceptnet5.ratelimit import TokenBucketLimiter
+from conceptnet5.edge_store import EdgeStore
+from conceptnet5.assoc_index import PrefixIndex, similar_to_vectors
+from sample_edges import sample_edge
+from sample_spaces import make_space
+import numpy as np
+import shutil
+import json
+
+class FakeSolr(object):
+    """
+    Answers Solr queries with pages of edges, found by their cursorMark, or
+    by None for queries without a cursor. A page that's an exception is
+    raised instead.
+    """
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = []
+
+    def query(self, params):
+        self.queries.append(dict(params))
+        page = self.pages[params.get('cursorMark')]
+        if isinstance(page, Exception):
+            raise page
+        docs, next_cursor = page
+        obj = {'response': {'numFound': len(docs), 'start': 0,
+                            'docs': [dict(doc) for doc in docs]}}
+        if next_cursor is not None:
+            obj['nextCursorMark'] = next_cursor
+        return obj
+
+def make_client(solr=None):
+    api.solr = solr
+    api.sharded_solr = None
+    api.EDGE_STORE_FILE = None
+    api.edge_store = None
+    api.response_cache = TTLCache(100)
+    api.rate_limiter = TokenBucketLimiter(1000, 1000)
+    api.ADMIN_KEY = None
+    return api.app.test_client()
+
+EDGES = [sample_edge('/c/en/dog', '/c/en/animal', 2.0),
+         sample_edge('/c/en/dog', '/c/en/pet', 1.0),
+         sample_edge('/c/en/cat', '/c/en/dog', 0.5)]
+
+def export_lines(response):
+    return [json.loads(line) for line in response.data.splitlines()]
+
+def test_export():
+    solr = FakeSolr({'*': (EDGES[:2], 'A'), 'A': (EDGES[2:], 'B'),
+                     'B': ([], 'B')})
+    client = make_client(solr)
+    response = client.get('/export/c/en/dog')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert export_lines(response) == EDGES
+    assert [query['cursorMark'] for query in solr.queries] == ['*', 'A', 'B']
+
+    response = client.get('/export/c/en/dog?fields=start,end')
+    assert export_lines(response)[0] == {'start': '/c/en/dog', 'end': '/c/en/animal'}
+
+def test_export_failure():
+    # If the first page fails, the export fails
+    client = make_client(FakeSolr({'*': SolrError('Solr is down')}))
+    assert client.get('/export/c/en/dog').status_code == 503
+
+    # If a later page fails, the last line says so
+    client = make_client(FakeSolr({'*': (EDGES[:2], 'A'),
+                                   'A': SolrError('Solr is down')}))
+    response = client.get('/export/c/en/dog')
+    assert response.status_code == 200
+    lines = export_lines(response)
+    assert lines[:2] == EDGES[:2]
+    assert lines[2]['error'] == 'export interrupted'
+
+def test_export_edge_store():
+    tempdir = tempfile.mkdtemp()
+    page_size = api.EXPORT_PAGE_SIZE
+    try:
+        edges = EDGES + [sample_edge('/c/en/dog', '/c/en/thing%d' % i, 0.1)
+                         for i in range(5)]
+        store = EdgeStore(tempdir + '/edges.db')
+        store.add_edges(edges)
+        store.close()
+        client = make_client()
+        api.EDGE_STORE_FILE = tempdir + '/edges.db'
+        api.EXPORT_PAGE_SIZE = 2
+        response = client.get('/export/c/en/dog')
+        assert response.status_code == 200
+        assert export_lines(response) == edges
+        response = client.get('/export/c/en/dog?minWeight=1.0')
+        assert export_lines(response) == EDGES[:2]
+        api.edge_store.close()
+    finally:
+        api.EXPORT_PAGE_SIZE = page_size
+        api.EDGE_STORE_FILE = None
+        api.edge_store = None
+        shutil.rmtree(tempdir)
+
+def test_rate_limit():
+    client = make_client(FakeSolr({None: (EDGES, None)}))
+    api.rate_limiter = TokenBucketLimiter(0.5, 2, clock=lambda: 0.)
+    assert client.get('/c/en/dog').status_code == 200
+    assert client.get('/c/en/dog').status_code == 200
+    response = client.get('/c/en/dog')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '2'
+    assert json.loads(response.data)['error'] == 'rate limit exceeded'
+
+    # Only admins can see the limiter's statistics
+    api.rate_limiter = TokenBucketLimiter(1000, 1000)
+    assert client.get('/ratelimit/info').status_code == 404
+    api.ADMIN_KEY = 'secret'
+    response = client.get('/ratelimit/info', headers={'X-Admin-Key': 'secret'})
+    assert json.loads(response.data)['allowed'] == 2
+
+def get_json(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    return json.loads(response.data)
+
+def follow_cursors(client, url):
+    edges = []
+    cursor = '*'
+    while cursor is not None:
+        result = get_json(client, url + '&cursor=' + cursor)
+        edges.extend(result['edges'])
+        cursor = result['nextCursor']
+    return edges
+
+def test_solr_cursors():
+    solr = FakeSolr({'*': (EDGES[:2], 'A'), 'A': (EDGES[2:], 'A')})
+    client = make_client(solr)
+    assert follow_cursors(client, '/c/en/dog?limit=2') == EDGES
+    assert solr.queries[0]['sort'] == 'score desc,id asc'
+    assert 'start' not in solr.queries[0]
+
+def test_edge_store_cursors():
+    tempdir = tempfile.mkdtemp()
+    try:
+        store = EdgeStore(tempdir + '/edges.db')
+        store.add_edges(EDGES)
+        store.close()
+        client = make_client()
+        api.EDGE_STORE_FILE = tempdir + '/edges.db'
+        # Highest weight first
+        assert follow_cursors(client, '/c/en/dog?limit=2') == EDGES
+        assert client.get('/c/en/dog?cursor=not-a-cursor').status_code == 400
+        api.edge_store.close()
+    finally:
+        api.EDGE_STORE_FILE = None
+        api.edge_store = None
+        shutil.rmtree(tempdir)
+
+def test_fields():
+    solr = FakeSolr({None: (EDGES, None)})
+    client = make_client(solr)
+    response = client.get('/c/en/dog?fields=start,rel,end,weight')
+    assert response.status_code == 200
+    # The response is trimmed to those fields, without indentation
+    assert '\n' not in response.data
+    result = json.loads(response.data)
+    assert result['edges'][0] == {'start': '/c/en/dog', 'rel': '/r/IsA',
+                                  'end': '/c/en/animal', 'weight': 2.0}
+    assert solr.queries[0]['fl'] == 'end,id,rel,score,start,weight'
+    assert 'indent' not in solr.queries[0]
+
+    assert client.get('/c/en/dog?fields=start,bogus').status_code == 400
+    assert client.get('/search?start=/c/en/dog&fields=bogus').status_code == 400
+
+def post_batch(client, body):
+    if not isinstance(body, basestring):
+        body = json.dumps(body)
+    return client.post('/assoc/batch', data=body)
+
+def test_assoc_batch():
+    space = make_space()
+    client = make_client()
+    api.commonsense_assoc = space
+    api.assoc_prefixes = PrefixIndex(space.labels)
+    try:
+        queries = ['/c/en/term0', [['/c/fr/term1', 1.0], '/c/ja/term2']]
+        response = post_batch(client, {'queries': queries, 'limit': 5,
+                                       'filter': '/c/ja/'})
+        assert response.status_code == 200
+        results = json.loads(response.data)['results']
+        vecs = np.vstack([
+            space.vector_from_terms([('/c/en/term0', 1.0)]),
+            space.vector_from_terms([('/c/fr/term1', 1.0), ('/c/ja/term2', 1.0)])
+        ])
+        expected = similar_to_vectors(space.assoc, space.labels, vecs, 5,
+                                      rows=PrefixIndex(space.labels).rows('/c/ja/'))
+        assert [[label for label, score in result['similar']] for result in results] == [
+            [label for label, score in similar] for similar in expected
+        ]
+        assert json.loads(post_batch(client, {'queries': []}).data) == {'results': []}
+
+        # Requests that aren't a JSON object with a list of queries, or that
+        # have malformed queries, are rejected
+        for body in ['not json', '["/c/en/term0"]', {'query': '/c/en/term0'},
+                     {'queries': '/c/en/term0'}, {'queries': [[[1, 2.0]]]},
+                     {'queries': [[['/c/en/term0', 'heavy']]]},
+                     {'queries': ['/c/en/term0'], 'limit': 'many'},
+                     {'queries': ['/c/en/term0'], 'filter': 3},
+                     {'queries': ['/c/en/term0'], 'filter': ['/c/en/']}]:
+            assert post_batch(client, body).status_code == 400
+
+        # So are batches that are too big
+        body = {'queries': ['/c/en/term0'] * (api.MAX_BATCH_SIZE + 1)}
+        assert post_batch(client, body).status_code == 413
+    finally:
+        api.commonsense_assoc = None
+        api.assoc_prefixes = None
+
+def test_response_cache():
+    solr = FakeSolr({None: (EDGES, None)})
+    client = make_client(solr)
+    assert client.get('/c/en/dog').headers['X-Cache'] == 'MISS'
+    response = client.get('/c/en/dog')
+    assert response.headers['X-Cache'] == 'HIT'
+    assert json.loads(response.data)['edges'] == EDGES
+    assert len(solr.queries) == 1
+
+    response = client.get('/c/en/dog', headers={'Cache-Control': 'no-cache'})
+    assert response.headers['X-Cache'] == 'BYPASS'
+    assert len(solr.queries) == 2
+
+    # Only admins can see the cache's statistics
+    assert client.get('/cache/info').status_code == 404
+    api.ADMIN_KEY = 'secret'
+    assert client.get('/cache/info', headers={'X-Admin-Key': 'wrong'}).status_code == 404
+    response = client.get('/cache/info', headers={'X-Admin-Key': 'secret'})
+    assert json.loads(response.data)['hits'] == 1
+
+class PartialSolr(FakeSolr):
+    """
+    A fan-out client where some shards didn't answer in time.
+    """
+    def query(self, params):
+        obj = FakeSolr.query(self, params)
+        obj['partial'] = True
+        return obj
+
+def test_partial_results():
+    solr = FakeSolr({None: (EDGES, None), '*': (EDGES, None)})
+    client = make_client(solr)
+    api.sharded_solr = PartialSolr({None: (EDGES[:1], None)})
+    try:
+        result = get_json(client, '/c/en/dog')
+        assert result['partial'] is True
+        assert result['edges'] == EDGES[:1]
+        # Partial results aren't cached
+        assert client.get('/c/en/dog').headers['X-Cache'] == 'MISS'
+        assert len(api.sharded_solr.queries) == 2
+        assert solr.queries == []
+
+        # Queries that Solr has to coordinate, such as ones with cursors,
+        # don't fan out
+        assert get_json(client, '/c/en/dog?cursor=*')['edges'] == EDGES
+    finally:
+        api.sharded_solr = None
+
+def test_solr_errors():
+    # A query that Solr rejects is the client's fault; anything else is ours
+    client = make_client(FakeSolr({None: SolrError('bad query', 400)}))
+    assert client.get('/c/en/dog').status_code == 400
+    client = make_client(FakeSolr({None: SolrError('Solr is down')}))
+    assert client.get('/c/en/dog').status_code == 503
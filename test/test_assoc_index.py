@@ -0,0 +1,148 @@
+from conceptnet5.assoc_index import (top_n, build_neighbors, NeighborIndex,
+    ClusterIndex, PrefixIndex, QuantizedMatrix, similar_to_vectors, row_runs,
+    score_rows, save_assoc_matrix, load_shared_assoc, load_quantized_assoc)
+from sample_spaces import make_space, LazySpace
+import numpy as np
+import tempfile
+import shutil
+
+def exact_similar(space, term, limit, filter=None):
+    sims = space.assoc.dot(space.vector_from_terms([(term, 1.0)]))
+    results = [(space.labels[i], sims[i]) for i in np.argsort(-sims)]
+    return [item for item in results if item[1] > 0 and
+            (filter is None or item[0].startswith(filter))][:limit]
+
+def test_top_n():
+    scores = np.array([0.5, 0.1, 0.9, 0.3])
+    assert list(top_n(scores, 2)) == [2, 0]
+    assert list(top_n(scores, 10)) == [2, 0, 3, 1]
+
+def test_neighbor_index():
+    space = make_space()
+    neighbors, scores = build_neighbors(space, k=30, block_size=64)
+    index = NeighborIndex(space.labels, neighbors, scores)
+    for term in space.labels[:20]:
+        expected = exact_similar(space, term, 10)
+        found = index.similar(term, 10)
+        assert [label for label, score in found] == [label for label, score in expected]
+        # The stored scores agree with the ones computed from the matrix,
+        # more closely than float32 could store them
+        assert np.allclose([score for label, score in found],
+                           [score for label, score in expected],
+                           rtol=0, atol=1e-12)
+
+    # The index can't answer for a rare filter, or for an unknown term
+    assert index.similar(space.labels[0], 30, filter='/c/fr/') is None
+    assert index.similar('/c/en/unknown', 10) is None
+
+def test_cluster_index():
+    space = make_space()
+    index = ClusterIndex.build(space, nclusters=8)
+    assert sorted(index.order) == range(200)
+    vec = space.vector_from_terms([('/c/en/term0', 1.0), ('/c/fr/term1', 0.5)])
+
+    # Probing every cluster is exact
+    exact = index.similar_to_vector(vec, 10, nprobe=8)
+    sims = space.assoc.dot(vec)
+    assert [label for label, score in exact] == [
+        space.labels[i] for i in np.argsort(-sims)[:10]
+    ]
+    filtered = index.similar_to_vector(vec, 10, filter='/c/ja/', nprobe=8)
+    assert all(label.startswith('/c/ja/') for label, score in filtered)
+
+    # Probing fewer clusters still ranks what it finds
+    approx = index.similar_to_vector(vec, 5, nprobe=2)
+    if approx is not None:
+        scores = [score for label, score in approx]
+        assert scores == sorted(scores, reverse=True)
+        assert all(score > 0 for score in scores)
+
+def test_prefix_index():
+    space = make_space()
+    index = PrefixIndex(space.labels)
+    assert sorted(index.language_rows) == ['/c/en/', '/c/fr/', '/c/ja/']
+    assert list(index.rows('/c/fr/term1')) == [1, 10, 13, 16, 19] + range(100, 200, 3)
+    for term in space.labels[:10]:
+        vec = space.vector_from_terms([(term, 1.0)])
+        for prefix in ['/c/en/', '/c/ja/', '/c/fr/term1']:
+            expected = exact_similar(space, term, 10, filter=prefix)
+            found = index.similar_to_vector(space.assoc, vec, 10, prefix)
+            assert [label for label, score in found] == [label for label, score in expected]
+
+def test_score_rows():
+    space = make_space()
+    vec = space.vector_from_terms([('/c/en/term0', 1.0)])
+    assert row_runs(np.array([2, 3, 4, 7, 9, 10])) == [(2, 5), (7, 8), (9, 11)]
+    assert row_runs(np.array([], dtype=np.int32)) == []
+    for rows in [np.arange(20, 80),             # one run of rows
+                 np.arange(0, 200, 3),          # many rows, scattered
+                 np.arange(0, 200, 13),         # a few rows, scattered
+                 np.array([], dtype=np.int32)]:
+        assert np.allclose(score_rows(space.assoc, rows, vec),
+                           space.assoc[rows].dot(vec))
+        vecs = np.vstack([vec, -vec]).T
+        assert np.allclose(score_rows(space.assoc, rows, vecs),
+                           space.assoc[rows].dot(vecs))
+
+def test_similar_to_vectors():
+    space = make_space()
+    terms = space.labels[:25]
+    vecs = np.vstack([space.vector_from_terms([(term, 1.0)]) for term in terms])
+    results = similar_to_vectors(space.assoc, space.labels, vecs, 10, block_size=10)
+    assert len(results) == 25
+    for term, found in zip(terms, results):
+        expected = exact_similar(space, term, 10)
+        assert [label for label, score in found] == [label for label, score in expected]
+
+    rows = PrefixIndex(space.labels).rows('/c/ja/')
+    results = similar_to_vectors(space.assoc, space.labels, vecs, 10, rows=rows)
+    for term, found in zip(terms, results):
+        expected = exact_similar(space, term, 10, filter='/c/ja/')
+        assert [label for label, score in found] == [label for label, score in expected]
+
+def test_quantized_matrix():
+    space = make_space()
+    matrix = QuantizedMatrix.quantize(space.assoc, block_size=64)
+    matrix.block_size = 50
+    assert matrix.shape == space.assoc.shape
+    assert np.allclose(matrix[3], space.assoc[3], atol=0.01)
+    assert np.allclose(matrix[[1, 2]], space.assoc[[1, 2]], atol=0.01)
+    vec = space.vector_from_terms([('/c/en/term0', 1.0)])
+    assert np.allclose(matrix.dot(vec), space.assoc.dot(vec), atol=0.05)
+    assert top_n(matrix.dot(vec), 1)[0] == 0
+
+    vecs = np.vstack([vec, space.vector_from_terms([('/c/fr/term1', 1.0)])])
+    assert np.allclose(matrix.dot(vecs.T), space.assoc.dot(vecs.T), atol=0.05)
+
+def test_load_shared_assoc():
+    space = make_space()
+    tempdir = tempfile.mkdtemp()
+    try:
+        save_assoc_matrix(LazySpace(space.labels, space.assoc), tempdir)
+        # The saved matrix replaces the one the space would compute, even
+        # when the space computes it as a property
+        lazy = LazySpace(space.labels, space.assoc)
+        assert load_shared_assoc(lazy, tempdir)
+        assert isinstance(lazy.assoc, np.memmap)
+        assert np.allclose(lazy.assoc, space.assoc)
+
+        # A matrix saved for a different space isn't used
+        lazy = LazySpace(space.labels[:100], space.assoc[:100])
+        assert not load_shared_assoc(lazy, tempdir)
+        assert not isinstance(lazy.assoc, np.memmap)
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_load_quantized_assoc():
+    space = make_space()
+    tempdir = tempfile.mkdtemp()
+    try:
+        lazy = LazySpace(space.labels, space.assoc)
+        assert not load_quantized_assoc(lazy, tempdir)
+        QuantizedMatrix.quantize(space.assoc).save(tempdir)
+        assert load_quantized_assoc(lazy, tempdir)
+        assert isinstance(lazy.assoc, QuantizedMatrix)
+        vec = space.vector_from_terms([('/c/en/term0', 1.0)])
+        assert np.allclose(lazy.assoc.dot(vec), space.assoc.dot(vec), atol=0.05)
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,88 @@
+from conceptnet5.cache import TTLCache, MemcacheCache
+import SocketServer
+import threading
+
+def test_ttl_cache():
+    now = [0.]
+    cache = TTLCache(2, ttl=10., clock=lambda: now[0])
+    cache.set('dog', 1)
+    cache.set('cat', 2)
+    assert cache.get('dog') == 1
+    cache.set('fish', 3)
+    # 'cat' was the least recently used
+    assert 'cat' not in cache
+    assert cache.get('dog') == 1
+
+    now[0] = 10.
+    assert cache.get('dog') is None
+    assert cache.get('fish') is None
+    info = cache.info()
+    assert info['hits'] == 2
+    assert info['misses'] == 2
+    assert info['size'] == 0
+
+def test_ttl_cache_bytes():
+    cache = TTLCache(10, maxbytes=10, sizeof=len)
+    cache.set('dog', 'woof')
+    cache.set('cat', 'meow')
+    assert cache.info()['bytes'] == 8
+    # Adding 'fish' would go over the limit, so the least recently used
+    # entry is discarded
+    cache.set('fish', 'blub')
+    assert 'dog' not in cache
+    assert cache.info()['bytes'] == 8
+
+    # Replacing a value counts its new size instead of its old one
+    cache.set('cat', 'purr purr')
+    assert 'fish' not in cache
+    assert cache.info()['bytes'] == 9
+
+    # A value that could never fit isn't cached
+    cache.set('whale', 'a very long song')
+    assert 'whale' not in cache
+    assert cache.get('cat') == 'purr purr'
+
+
+class FakeMemcacheHandler(SocketServer.StreamRequestHandler):
+    """
+    Understands just enough of the memcached protocol to test MemcacheCache.
+    """
+    data = {}
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            parts = line.split()
+            if parts[0] == 'get':
+                key = parts[1]
+                if key in self.data:
+                    value = self.data[key]
+                    self.wfile.write('VALUE %s 0 %d\r\n%s\r\n' % (key, len(value), value))
+                self.wfile.write('END\r\n')
+            elif parts[0] == 'set':
+                value = self.rfile.read(int(parts[4]) + 2)[:-2]
+                self.data[parts[1]] = value
+                self.wfile.write('STORED\r\n')
+
+def test_memcache_cache():
+    server = SocketServer.ThreadingTCPServer(('127.0.0.1', 0), FakeMemcacheHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    try:
+        cache = MemcacheCache('127.0.0.1:%d' % server.server_address[1], namespace='test:')
+        assert cache.get('q=nodes:/c/en/dog') is None
+        cache.set('q=nodes:/c/en/dog', {'numFound': 1, 'edges': [u'\u72ac']})
+        assert cache.get('q=nodes:/c/en/dog') == {'numFound': 1, 'edges': [u'\u72ac']}
+        assert cache.info()['hits'] == 1
+        cache.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # With the server gone, the cache just misses
+    assert cache.get('q=nodes:/c/en/dog') is None
+    assert cache.info()['errors'] == 1
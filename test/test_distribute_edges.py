@@ -0,0 +1,22 @@
+from conceptnet5.builders.distribute_edges import stable_hash, EdgeDistributor
+import tempfile
+import shutil
+
+def test_stable_hash():
+    # These values must never change, or every shard would be rebuilt.
+    assert stable_hash('/a/[/r/IsA/,/c/en/dog/,/c/en/animal/]') == stable_hash(u'/a/[/r/IsA/,/c/en/dog/,/c/en/animal/]')
+    assert stable_hash('') == 338333539836370388
+
+def test_distributor_counts():
+    tempdir = tempfile.mkdtemp()
+    try:
+        distributor = EdgeDistributor(tempdir, 4)
+        for i in range(100):
+            distributor.handle_line('/a/[/r/IsA/,/c/en/thing_%d/]\tmore\n' % (i % 10))
+        distributor.close()
+        stats = distributor.stats()
+        assert stats['total'] == 100
+        assert all(count % 10 == 0 for count in stats['counts'])
+        assert stats['skew'] >= 1.0
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,58 @@
+from conceptnet5.edge_store import EdgeStore
+from sample_edges import sample_edge
+import tempfile
+import shutil
+
+def test_edge_store():
+    tempdir = tempfile.mkdtemp()
+    try:
+        store = EdgeStore(tempdir + '/edges.db')
+        store.add_edges([
+            sample_edge('/c/en/dog', '/c/en/animal', 2.0),
+            sample_edge('/c/en/dog/n/pet', '/c/en/pet', 3.0),
+            sample_edge('/c/en/cat', '/c/en/animal', 1.0, dataset='/d/wordnet/3.0'),
+        ])
+        count, edges = store.query({'nodes': '/c/en/dog'})
+        assert count == 2
+        assert [edge['end'] for edge in edges] == ['/c/en/pet', '/c/en/animal']
+
+        count, edges = store.query({'end': '/c/en/animal'}, offset=1, limit=1)
+        assert count == 2
+        assert [edge['start'] for edge in edges] == ['/c/en/cat']
+
+        count, edges = store.query([('nodes', '/c/en/animal'), ('dataset', '/d/conceptnet/5/combined-core')])
+        assert count == 1
+        count, edges = store.query({'sources': '/s/contributor/omcs/rspeer'}, min_weight=2.0)
+        assert count == 2
+
+        # Prefixes match whole path components
+        count, edges = store.query({'start': '/c/en/do'})
+        assert count == 0
+        count, edges = store.query({'start': '/c/en/dog/'})
+        assert count == 2
+
+        count, edges, cursor = store.query_page({'nodes': '/c/en/'}, limit=2)
+        assert count == 3 and len(edges) == 2
+        count, more, cursor = store.query_page({'nodes': '/c/en/'}, cursor=cursor, limit=2)
+        assert [edge['start'] for edge in edges + more] == ['/c/en/dog/n/pet', '/c/en/dog', '/c/en/cat']
+        assert cursor is None
+        # Only the first page is counted
+        assert count is None
+
+        # Pages without prefixes are found in the weight index, without
+        # sorting
+        count, edges, cursor = store.query_page({}, cursor=[2.0, 1], limit=2)
+        assert [edge['start'] for edge in edges] == ['/c/en/cat']
+        plan = ' '.join(row[-1] for row in store.db.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM edges '
+            'WHERE weight <= ? AND (weight < ? OR id > ?) '
+            'ORDER BY weight DESC, id LIMIT ?', [2.0, 2.0, 1, 2]
+        ))
+        assert 'edges_weight_id' in plan and 'B-TREE' not in plan
+
+        edges = list(store.iter_edges({'nodes': '/c/en/'}, batch_size=2))
+        assert [edge['start'] for edge in edges] == ['/c/en/dog/n/pet', '/c/en/dog', '/c/en/cat']
+        assert list(store.iter_edges({'nodes': '/c/en/bird'})) == []
+        store.close()
+    finally:
+        shutil.rmtree(tempdir)
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from conceptnet5.edges import make_edge, encode_edge, project_edge
+import json
+
+def test_encode_edge():
+    edge = make_edge(u'/r/IsA', u'/c/en/dog', u'/c/ja/動物',
+                     dataset=u'/d/test', license=u'/l/CC/By',
+                     sources=[u'/s/test'], surfaceText=u'a "dog" is\nan animal')
+    for ensure_ascii in (True, False):
+        line = encode_edge(edge, ensure_ascii=ensure_ascii)
+        assert json.loads(line) == edge
+        assert '\n' not in line
+    assert u'動物' in encode_edge(edge, ensure_ascii=False)
+
+    edge['surfaceText'] = None
+    edge['weight'] = 2
+    assert json.loads(encode_edge(edge)) == edge
+
+    # Things that aren't edges still get encoded
+    assert json.loads(encode_edge({'from': 'a', 'to': 'b'})) == {'from': 'a', 'to': 'b'}
+
+def test_project_edge():
+    edge = make_edge(u'/r/IsA', u'/c/en/dog', u'/c/en/animal',
+                     dataset=u'/d/test', license=u'/l/CC/By',
+                     sources=[u'/s/test'], weight=2)
+    assert project_edge(edge, ['start', 'rel', 'end', 'weight', 'score']) == {
+        'start': u'/c/en/dog', 'rel': u'/r/IsA', 'end': u'/c/en/animal',
+        'weight': 2
+    }
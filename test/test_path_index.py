@@ -0,0 +1,91 @@
+from conceptnet5.path_index import build_path_index, PathIndex
+from sample_edges import sample_edge
+from StringIO import StringIO
+import tempfile
+import shutil
+import json
+
+def test_path_index():
+    tempdir = tempfile.mkdtemp()
+    try:
+        edges = [
+            sample_edge('/c/en/dog', '/c/en/animal', 2.0),
+            sample_edge('/c/en/dog/n/pet', '/c/en/pet', 3.0),
+            sample_edge('/c/en/cat', '/c/en/animal', 1.0, dataset='/d/wordnet/3.0'),
+            sample_edge('/c/en/pet', '/c/en/dog', 1.5),
+            sample_edge('/c/en/dog-house', '/c/en/house', 1.0),
+        ]
+        stream = StringIO(''.join(json.dumps(edge) + '\n' for edge in edges))
+        # A tiny run size makes the external sort merge several runs
+        build_path_index([stream], tempdir + '/index', run_size=2, tmpdir=tempdir)
+        index = PathIndex(tempdir + '/index')
+
+        count, found = index.query({'start': '/c/en/dog'})
+        assert count == 2
+        assert [edge['end'] for edge in found] == ['/c/en/animal', '/c/en/pet']
+
+        count, found = index.query({'start': '/c/en/dog'}, offset=1, limit=1)
+        assert count == 2
+        assert [edge['end'] for edge in found] == ['/c/en/pet']
+
+        count, found = index.query({'nodes': '/c/en/dog'})
+        assert count == 3
+        count, found = index.query([('nodes', '/c/en/animal'), ('dataset', '/d/conceptnet')])
+        assert count == 1
+        assert found[0]['start'] == '/c/en/dog'
+        count, found = index.query({'end': '/c/en/'}, min_weight=2.0)
+        assert count == 2
+        count, found = index.query({'start': '/c/en/zebra'})
+        assert count == 0 and found == []
+
+        # Prefixes match whole path components, even when other values sort
+        # between the prefix and the values below it
+        count, found = index.query({'start': '/c/en/do'})
+        assert count == 0
+        count, found = index.query({'nodes': '/c/en/dog/'})
+        assert count == 3
+        assert '/c/en/dog-house' not in [edge['start'] for edge in found]
+
+        found = []
+        cursor = None
+        while True:
+            count, page, cursor = index.query_page({'start': '/c/en/dog'}, cursor=cursor, limit=1)
+            found.extend(page)
+            if cursor is None:
+                break
+        assert [edge['start'] for edge in found] == ['/c/en/dog', '/c/en/dog/n/pet']
+
+        # Unlike the edge store, the results are in the order of the index,
+        # not ranked by weight
+        count, found = index.query({'start': '/c/en'})
+        assert [edge['start'] for edge in found] == [
+            '/c/en/cat', '/c/en/dog', '/c/en/dog-house', '/c/en/dog/n/pet',
+            '/c/en/pet'
+        ]
+        index.close()
+    finally:
+        shutil.rmtree(tempdir)
+
+def test_path_index_pages():
+    tempdir = tempfile.mkdtemp()
+    try:
+        edges = [sample_edge('/c/en/thing%d' % i, '/c/en/thing%d' % (i + 1), 1.0)
+                 for i in range(10)]
+        stream = StringIO(''.join(json.dumps(edge) + '\n' for edge in edges))
+        build_path_index([stream], tempdir + '/index', tmpdir=tempdir)
+        index = PathIndex(tempdir + '/index')
+        for field in ['start', 'nodes']:
+            count, expected = index.query({field: '/c/en'}, limit=100)
+            found = []
+            cursor = None
+            while True:
+                page_count, page, cursor = index.query_page({field: '/c/en'}, cursor=cursor, limit=3)
+                assert len(page) <= 3
+                found.extend(page)
+                if cursor is None:
+                    break
+            assert [edge['id'] for edge in found] == [edge['id'] for edge in expected]
+            assert len(found) == count == 10
+        index.close()
+    finally:
+        shutil.rmtree(tempdir)
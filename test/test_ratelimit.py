@@ -0,0 +1,82 @@
+from conceptnet5.ratelimit import TokenBucketLimiter, SharedTokenBucketLimiter
+import multiprocessing
+import os
+
+def check_limiter(limiter, now):
+    for i in range(3):
+        assert limiter.allow('1.2.3.4')
+    assert not limiter.allow('1.2.3.4')
+    assert limiter.allow('5.6.7.8')
+
+    # The empty bucket gets a token back in half a second, or less as time
+    # goes by
+    assert limiter.retry_after('1.2.3.4') == 0.5
+    now[0] += 0.25
+    assert limiter.retry_after('1.2.3.4') == 0.25
+    assert limiter.retry_after('5.6.7.8') == 0.
+    now[0] += 0.25
+    assert limiter.allow('1.2.3.4')
+    assert not limiter.allow('1.2.3.4')
+
+def test_token_bucket():
+    now = [0.]
+    limiter = TokenBucketLimiter(2, 3, maxsize=2, clock=lambda: now[0])
+    check_limiter(limiter, now)
+    info = limiter.info()
+    assert info['allowed'] == 5
+    assert info['rejected'] == 2
+
+    # The least recently seen client is forgotten when the limiter is full
+    limiter.allow('9.9.9.9')
+    assert '5.6.7.8' not in limiter.buckets
+    assert len(limiter.buckets) == 2
+
+def use_up_tokens(limiter):
+    for i in range(3):
+        limiter.allow('1.2.3.4')
+
+def test_shared_token_bucket():
+    now = [0.]
+    limiter = SharedTokenBucketLimiter(2, 3, slots=16, clock=lambda: now[0])
+    process = multiprocessing.Process(target=use_up_tokens, args=(limiter,))
+    process.start()
+    process.join()
+    # The other process used up the bucket
+    assert not limiter.allow('1.2.3.4')
+    assert limiter.retry_after('1.2.3.4') == 0.5
+    assert limiter.info()['allowed'] == 3
+    assert limiter.info()['rejected'] == 1
+
+def test_shared_slot_collisions():
+    now = [0.]
+    limiter = SharedTokenBucketLimiter(2, 3, slots=4, clock=lambda: now[0])
+    keys = ['1.1.1.1', '2.2.2.2', '3.3.3.3', '4.4.4.4']
+    for key in keys:
+        for i in range(3):
+            assert limiter.allow(key)
+    # A client that has to take over another's slot doesn't get a new
+    # bucket, and neither does the client it pushed out
+    assert not limiter.allow('5.5.5.5')
+    assert limiter.retry_after('5.5.5.5') == 0.5
+    for key in keys:
+        assert not limiter.allow(key)
+
+    # Buckets that have refilled can be taken over
+    now[0] += 10.
+    for i in range(3):
+        assert limiter.allow('5.5.5.5')
+
+def die_holding_lock(limiter):
+    limiter._acquire(0)
+    os._exit(0)
+
+def test_shared_lock_recovery():
+    limiter = SharedTokenBucketLimiter(2, 3, slots=4)
+    process = multiprocessing.Process(target=die_holding_lock, args=(limiter,))
+    process.start()
+    process.join()
+    # The lock that the dead process held is released, and the limiter still
+    # counts requests
+    assert limiter.allow('1.2.3.4')
+    assert limiter.allow('1.2.3.4')
+    assert limiter.info()['allowed'] == 2
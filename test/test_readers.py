@@ -0,0 +1,59 @@
+from conceptnet5.readers import transform_stream, _chunks
+from conceptnet5.readers.conceptnet4 import build_edges, CN4Builder
+from StringIO import StringIO
+import json
+
+def numbered_results(line):
+    # Lines have different numbers of results, so the output doesn't line up
+    # with the chunks of input
+    for i in range(int(line) % 3):
+        yield u'%s-%d' % (line, i)
+
+def transform_lines(func, lines, **kwargs):
+    out = StringIO()
+    transform_stream(func, StringIO(''.join(line + '\n' for line in lines)),
+                     out, **kwargs)
+    return out.getvalue().splitlines()
+
+def test_chunks():
+    assert list(_chunks(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(_chunks(range(4), 2)) == [[0, 1], [2, 3]]
+    assert list(_chunks([], 2)) == []
+
+def test_transform_stream():
+    lines = [str(i) for i in range(100)]
+    expected = transform_lines(numbered_results, lines)
+    assert expected[:4] == ['1-0', '2-0', '2-1', '4-0']
+
+    # Workers give the same output, in the same order, however the lines are
+    # divided into chunks
+    for chunk_size in [1, 7, 1000]:
+        assert transform_lines(numbered_results, lines, workers=3,
+                               chunk_size=chunk_size) == expected
+        unordered = transform_lines(numbered_results, lines, workers=3,
+                                    chunk_size=chunk_size, ordered=False)
+        assert sorted(unordered) == sorted(expected)
+
+def cn4_line(start, end, creator):
+    return json.dumps({
+        'lang': 'en', 'goodness': 2, 'polarity': 1, 'relname': 'IsA',
+        'frame_text': '{1} is {2}', 'startText': start, 'endText': end,
+        'activity': 'testing', 'creator': creator, 'votes': []
+    })
+
+def test_conceptnet4_duplicates():
+    lines = [cn4_line('dog', 'animal', 'rspeer'),
+             cn4_line('cat', 'animal', 'rspeer'),
+             cn4_line('dog', 'animal', 'rspeer'),
+             cn4_line('dog', 'animal', 'havasi')]
+    # The same assertion from the same contributor is only written once, even
+    # when its copies were built by different workers
+    for workers in [1, 2]:
+        builder = CN4Builder()
+        edges = [json.loads(line) for line in transform_lines(
+            build_edges, lines, workers=workers, chunk_size=1,
+            postprocess=builder.check_seen
+        )]
+        assert [(edge['start'], 'havasi' in edge['sources']) for edge in edges] == [
+            (u'/c/en/dog', False), (u'/c/en/cat', False), (u'/c/en/dog', True)
+        ]
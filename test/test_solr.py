@@ -0,0 +1,150 @@
+from conceptnet5.solr import SolrClient, ShardedSolrClient, SolrError
+import BaseHTTPServer
+import threading
+import time
+import json
+
+class FakeSolrHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    failures = []
+
+    def do_GET(self):
+        if self.failures:
+            status = self.failures.pop(0)
+            body = 'error'
+        else:
+            status = 200
+            body = json.dumps({'response': {'path': self.path}})
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class IdleTimeoutHandler(FakeSolrHandler):
+    """
+    Closes each connection after answering, without saying so, the way a
+    server does when a kept-alive connection has been idle for too long.
+    """
+    def do_GET(self):
+        FakeSolrHandler.do_GET(self)
+        self.close_connection = 1
+
+class FakeShardHandler(FakeSolrHandler):
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        docs = self.server.docs
+        body = json.dumps({'response': {
+            'numFound': len(docs), 'start': 0, 'maxScore': docs[0]['score'],
+            'docs': docs
+        }})
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class IdleTimeoutShardHandler(FakeShardHandler):
+    def do_GET(self):
+        FakeShardHandler.do_GET(self)
+        self.close_connection = 1
+
+def run_fake_solr(handler=FakeSolrHandler):
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), handler)
+    # Clients that give up on a slow response aren't an error here
+    server.handle_error = lambda request, address: None
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def test_solr_client():
+    server = run_fake_solr()
+    try:
+        client = SolrClient('http://127.0.0.1:%d/solr/select?' % server.server_port,
+                            backoff=0.)
+        result = client.query({'q': 'uri:/a/test'})
+        assert result['response']['path'] == '/solr/select?q=uri%3A%2Fa%2Ftest'
+
+        # The connection is kept for the next request
+        assert client.idle.qsize() == 1
+        client.query({'q': 'uri:/a/test'})
+        assert client.idle.qsize() == 1
+
+        # Server errors are retried, but bad queries aren't
+        FakeSolrHandler.failures[:] = [500, 500]
+        client.query({'q': 'uri:/a/test'})
+        FakeSolrHandler.failures[:] = [400]
+        try:
+            client.query({'q': 'uri:/a/test'})
+            assert False, 'expected a SolrError'
+        except SolrError, error:
+            assert error.status == 400
+        client.close()
+    finally:
+        server.shutdown()
+
+def test_stale_connections():
+    server = run_fake_solr(IdleTimeoutHandler)
+    try:
+        # Requests on connections that the server has closed are sent again
+        # on a new connection, even when retries are turned off
+        client = SolrClient('http://127.0.0.1:%d/solr/select' % server.server_port,
+                            retries=0)
+        for i in range(3):
+            assert client.query({'q': 'uri:/a/test'})['response']['path']
+            assert client.idle.qsize() == 1
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_sharded_solr_client():
+    shards = [run_fake_solr(FakeShardHandler) for i in range(3)]
+    shards[0].delay = shards[1].delay = 0.
+    shards[2].delay = 0.5
+    shards[0].docs = [{'id': 'a', 'score': 3.}, {'id': 'c', 'score': 1.}]
+    shards[1].docs = [{'id': 'b', 'score': 2.}]
+    shards[2].docs = [{'id': 'z', 'score': 9.}]
+    try:
+        urls = ['http://127.0.0.1:%d/solr/select' % shard.server_port
+                for shard in shards]
+        client = ShardedSolrClient(urls[:2])
+        result = client.query({'q': 'nodes:/c/en/dog', 'start': 1, 'rows': 2})
+        assert not result['partial']
+        assert result['response']['numFound'] == 3
+        assert result['response']['maxScore'] == 3.
+        assert [doc['id'] for doc in result['response']['docs']] == ['b', 'c']
+        client.close()
+
+        # The slow shard is left out
+        client = ShardedSolrClient(urls, timeout=0.1)
+        result = client.query({'q': 'nodes:/c/en/dog'})
+        assert result['partial']
+        assert [doc['id'] for doc in result['response']['docs']] == ['a', 'b', 'c']
+        client.close()
+    finally:
+        for shard in shards:
+            shard.shutdown()
+
+def test_sharded_stale_connections():
+    shards = [run_fake_solr(IdleTimeoutShardHandler) for i in range(2)]
+    for shard, doc_id in zip(shards, ['a', 'b']):
+        shard.delay = 0.
+        shard.docs = [{'id': doc_id, 'score': 1.}]
+    try:
+        urls = ['http://127.0.0.1:%d/solr/select' % shard.server_port
+                for shard in shards]
+        # Shards aren't retried, but connections they closed while idle
+        # shouldn't make the results partial
+        client = ShardedSolrClient(urls, pool_size=1)
+        for i in range(3):
+            result = client.query({'q': 'nodes:/c/en/dog'})
+            assert not result['partial']
+            assert result['response']['numFound'] == 2
+        client.close()
+    finally:
+        for shard in shards:
+            shard.shutdown()
+            shard.server_close()
@@ -0,0 +1,12 @@
+from conceptnet5.builders.sort_edges import external_sort
+from StringIO import StringIO
+
+def test_external_sort():
+    lines = ['%d\tsome edge\n' % ((i * 7919) % 1000) for i in range(3000)]
+    expected = sorted(set(lines))
+    streams = [StringIO(''.join(lines[:1500])), StringIO(''.join(lines[1500:]))]
+    assert list(external_sort(streams, run_size=100)) == expected
+
+def test_sort_in_memory():
+    # A missing newline at the end of the input doesn't cause problems
+    assert list(external_sort([StringIO('b\na\nb')])) == ['a\n', 'b\n']
@@ -1,5 +1,17 @@
-from conceptnet5.nodes import normalize_uri
+from conceptnet5.nodes import (normalize_uri, make_concept_uri,
+    make_concept_uris, concept_uri_cache_info)
 
 def test_normalize_uri():
     assert normalize_uri(' one two') == u'one_two'
     assert normalize_uri(normalize_uri(' one two')) == u'one_two'
+
+def test_make_concept_uris():
+    batch = [(u'Hot Dog', 'fr'), (u'chat', 'fr'), (u'Hot Dog', 'fr')]
+    before = concept_uri_cache_info()
+    uris = make_concept_uris(batch)
+    assert uris == [u'/c/fr/hot_dog', u'/c/fr/chat', u'/c/fr/hot_dog']
+    after = concept_uri_cache_info()
+    # The repeated term is only looked up once.
+    assert (after['hits'] + after['misses']) - (before['hits'] + before['misses']) == 2
+    assert make_concept_uri(u'Hot Dog', 'fr') == u'/c/fr/hot_dog'
+    assert concept_uri_cache_info()['hits'] == after['hits'] + 1